@@ -0,0 +1,191 @@
+import os
+import sys
+import time
+import heapq
+import argparse
+import itertools
+import warnings
+import numpy as np
+import pandas as pd
+import joblib
+from concurrent.futures import ProcessPoolExecutor
+from indicators import FEATURE_COLS
+from candle_store import CandleStore
+from portfolio_store import TAKE_PROFIT, STOP_LOSS
+
+# --- VECTORIZED BACKTEST (HybridAgent ensemble strategy over stored candles) ---
+# Features and forest probabilities are computed once for the whole history; entry
+# signals, exit bars and the equity curve are array operations. Only the accepted
+# entries are walked in Python, to apply the shared wallet's cash limit.
+# The LLM is not replayed: decisions are the ensemble fallback the agent uses without it.
+# Usage:
+#   python train_fleet.py                       # fills candles/ (or: --refresh here)
+#   python backtest.py --risk 0.3 0.6 0.9 --tp 0.01 0.015 0.02 --sl -0.02 -0.03
+warnings.filterwarnings("ignore")
+
+TICKERS = ["BTC-USD", "ETH-USD", "SOL-USD", "DOGE-USD"]
+STARTING_BALANCE = 10000.0
+POSITION_SIZE = 1000.0
+DEFAULTS = {"risk_weight": 0.6, "take_profit": TAKE_PROFIT, "stop_loss": STOP_LOSS, "buy_score": 0.15, "min_conf": 10}
+EXIT_HORIZON = 32  # Bars searched in the first pass for a TP/SL hit; doubled for each later pass
+EXIT_CHUNK = 256   # Entries per broadcast block (bounds memory at chunk x horizon)
+
+def prepare(tickers=TICKERS, store=None, since=None):
+    """Per ticker: timestamps, close, RSI and P(up) from the fleet model, for the whole history."""
+    from model import DataProcessor
+    store = store or CandleStore()
+    processor = DataProcessor()
+    data = {}
+    for ticker, candles in store.load_many(tickers).items():
+        if not os.path.exists(f"model_{ticker}.pkl"): continue
+        df = processor.add_indicators(candles.copy())
+        if since is not None: df = df[df.index >= pd.Timestamp(since, tz="UTC")]
+        if len(df) < 2: continue
+        forest = joblib.load(f"model_{ticker}.pkl")
+        data[ticker] = {
+            "time": df.index.values.astype("datetime64[ns]").astype(np.int64),
+            "close": df["Close"].to_numpy(dtype=np.float64),
+            "rsi": df["RSI"].to_numpy(dtype=np.float64),
+            "p_up": forest.predict_proba(df[FEATURE_COLS].to_numpy())[:, 1],
+        }
+    return data
+
+def entry_signals(series, params):
+    # Same blend as HybridAgent.analyze + ensemble_signal + the finalize buy rule
+    ml_vote = np.where(series["p_up"] > 0.5, 1.0, -1.0)
+    logic_vote = np.where(series["rsi"] < 30, 1.0, np.where(series["rsi"] > 70, -1.0, 0.0))
+    w = params["risk_weight"]
+    score = ml_vote * w + logic_vote * (1.0 - w)
+    conf = 50 + score * 50
+    return np.flatnonzero((score > params["buy_score"]) & (conf > params["min_conf"]))
+
+def exit_bars(close, entries, take_profit, stop_loss, horizon=EXIT_HORIZON):
+    """First bar after each entry whose close crosses +take_profit / stop_loss (-1 = still open)."""
+    n = len(close)
+    exits = np.full(len(entries), -1)
+    pending = np.arange(len(entries))
+    offset = 1
+    while pending.size:
+        for chunk in np.array_split(pending, max(1, -(-pending.size // EXIT_CHUNK))):
+            start = entries[chunk]
+            idx = start[:, None] + np.arange(offset, offset + horizon)[None, :]
+            valid = idx < n
+            change = close[np.minimum(idx, n - 1)] / close[start][:, None] - 1
+            hit = valid & ((change >= take_profit) | (change <= stop_loss))
+            found = hit.any(axis=1)
+            exits[chunk[found]] = idx[found, hit[found].argmax(axis=1)]
+        # Entries with no hit in this window but history left to search go another, longer round
+        pending = pending[(exits[pending] < 0) & (entries[pending] + offset + horizon < n)]
+        offset += horizon
+        horizon *= 2
+    return exits
+
+def run(data, params):
+    """One configuration over every ticker with one shared wallet, like PortfolioManager."""
+    params = {**DEFAULTS, **params}
+    candidates = []
+    for ticker, series in data.items():
+        entries = entry_signals(series, params)
+        exits = exit_bars(series["close"], entries, params["take_profit"], params["stop_loss"])
+        for i, j in zip(entries.tolist(), exits.tolist()):
+            candidates.append((series["time"][i], ticker, i, j))
+    candidates.sort()
+
+    # Cash gate: exits due at or before a bar settle first (check_exit runs before the buy)
+    balance, open_exits, accepted = STARTING_BALANCE, [], []
+    for t, ticker, i, j in candidates:
+        while open_exits and open_exits[0][0] <= t: balance += heapq.heappop(open_exits)[1]
+        if balance < POSITION_SIZE: continue
+        balance -= POSITION_SIZE
+        series = data[ticker]
+        units = POSITION_SIZE / series["close"][i]
+        if j >= 0: heapq.heappush(open_exits, (series["time"][j], units * series["close"][j]))
+        accepted.append((ticker, i, j, units))
+    return summarize(data, accepted)
+
+def summarize(data, accepted):
+    # Equity curve on the union timeline: cash flows + units held, both as cumsum'd deltas
+    timeline = np.unique(np.concatenate([s["time"] for s in data.values()]))
+    cash = np.zeros(len(timeline))
+    market_value = np.zeros(len(timeline))
+    profits = []
+    by_ticker = {}
+    for ticker, i, j, units in accepted: by_ticker.setdefault(ticker, []).append((i, j, units))
+    for ticker, trades in by_ticker.items():
+        series = data[ticker]
+        pos = np.searchsorted(timeline, series["time"])
+        i, j, units = (np.array(col) for col in zip(*trades))
+        closed = j >= 0
+        held = np.zeros(len(timeline))
+        np.add.at(cash, pos[i], -POSITION_SIZE)
+        np.add.at(held, pos[i], units)
+        np.add.at(cash, pos[j[closed]], units[closed] * series["close"][j[closed]])
+        np.add.at(held, pos[j[closed]], -units[closed])
+        # Close carried forward onto bars where this ticker has no candle
+        close = series["close"][np.maximum(np.searchsorted(series["time"], timeline, side="right") - 1, 0)]
+        market_value += np.cumsum(held) * close
+        profits.extend((units[closed] * series["close"][j[closed]] - POSITION_SIZE).tolist())
+
+    equity = STARTING_BALANCE + np.cumsum(cash) + market_value
+    peak = np.maximum.accumulate(equity)
+    profits = np.array(profits)
+    return {
+        "final_equity": round(float(equity[-1]), 2),
+        "return_pct": round(float((equity[-1] - STARTING_BALANCE) / STARTING_BALANCE * 100), 2),
+        "max_drawdown_pct": round(float(((equity - peak) / peak).min() * 100), 2),
+        "trades": int(len(profits)),
+        "open_trades": int(len(accepted) - len(profits)),
+        "win_rate": round(float((profits > 0).mean()), 4) if len(profits) else 0.0,
+        "avg_profit": round(float(profits.mean()), 2) if len(profits) else 0.0,
+    }
+
+# --- PARAMETER SWEEP (process pool; history is shipped to each worker once) ---
+WORKER_DATA = None
+
+def init_worker(data):
+    global WORKER_DATA
+    WORKER_DATA = data
+
+def run_worker(params):
+    return params, run(WORKER_DATA, params)
+
+def sweep(data, grid, n_jobs=None):
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1 or len(grid) == 1: return [(params, run(data, params)) for params in grid]
+    with ProcessPoolExecutor(max_workers=min(n_jobs, len(grid)), initializer=init_worker, initargs=(data,)) as pool:
+        return list(pool.map(run_worker, grid, chunksize=max(1, len(grid) // (n_jobs * 4))))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest the HybridAgent ensemble strategy on stored candles")
+    parser.add_argument("--tickers", nargs="+", default=TICKERS)
+    parser.add_argument("--risk", nargs="+", type=float, default=[DEFAULTS["risk_weight"]])
+    parser.add_argument("--tp", nargs="+", type=float, default=[DEFAULTS["take_profit"]])
+    parser.add_argument("--sl", nargs="+", type=float, default=[DEFAULTS["stop_loss"]])
+    parser.add_argument("--buy-score", nargs="+", type=float, default=[DEFAULTS["buy_score"]])
+    parser.add_argument("--since", help="Only replay bars from this date (e.g. after the models' training window)")
+    parser.add_argument("--refresh", action="store_true", help="Download new candles into the store first")
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    if args.refresh:
+        from model import DataProcessor
+        CandleStore().update(DataProcessor(), args.tickers)
+    start = time.perf_counter()
+    data = prepare(args.tickers, since=args.since)
+    if not data:
+        print("❌ No stored candles / models. Run `python train_fleet.py` or pass --refresh.")
+        sys.exit(1)
+    bars = sum(len(s["close"]) for s in data.values())
+    print(f"📼 {len(data)} tickers, {bars} bars scored in {time.perf_counter() - start:.2f}s")
+
+    grid = [{"risk_weight": r, "take_profit": tp, "stop_loss": sl, "buy_score": b}
+            for r, tp, sl, b in itertools.product(args.risk, args.tp, args.sl, args.buy_score)]
+    start = time.perf_counter()
+    results = sweep(data, grid, args.jobs)
+    print(f"🧪 {len(grid)} configurations in {time.perf_counter() - start:.2f}s\n")
+
+    print(f"{'risk':>5}{'tp':>8}{'sl':>8}{'score':>7}{'return%':>10}{'maxDD%':>9}{'trades':>8}{'open':>6}{'win':>7}{'avg$':>9}")
+    for params, r in sorted(results, key=lambda pr: -pr[1]["return_pct"])[:args.top]:
+        print(f"{params['risk_weight']:>5.2f}{params['take_profit']:>8.3f}{params['stop_loss']:>8.3f}{params['buy_score']:>7.2f}"
+              f"{r['return_pct']:>10.2f}{r['max_drawdown_pct']:>9.2f}{r['trades']:>8}{r['open_trades']:>6}{r['win_rate']:>7.2%}{r['avg_profit']:>9.2f}")
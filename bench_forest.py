@@ -0,0 +1,82 @@
+import glob
+import time
+import warnings
+import numpy as np
+import pandas as pd
+import joblib
+from forest import CompactForest
+from lstm import LSTMScorer, SEED_BARS
+from indicators import INDICATOR_COLS
+
+# Microbenchmark: sklearn predict_proba vs the packed-array kernel on fleet models.
+# Checks bit-exact parity first, then reports p50/p99 latency per call.
+# The shipped LSTM checkpoints are timed on the same fleet for comparison.
+warnings.filterwarnings("ignore")
+
+TICKERS = ["BTC-USD", "ETH-USD", "SOL-USD", "DOGE-USD"]
+CALLS = 300
+
+def sample_features(n, seed=0):
+    # Roughly the live ranges of Log_Ret, Vol, RSI, Momentum
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(n, 4)) * [0.004, 0.002, 15, 0.01] + [0, 0.004, 50, 0]
+
+def latency(fn, X, calls=CALLS):
+    fn(X) # Warm up
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn(X)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+def sample_frames(n, seed=0):
+    # Live-shaped feature frames (indicator columns + Close) for every fleet ticker
+    frames = {}
+    for k, ticker in enumerate(TICKERS):
+        rng = np.random.default_rng(seed + k)
+        index = pd.date_range("2026-01-01", periods=n, freq="15min", tz="UTC")
+        X = rng.normal(size=(n, 5)) * [0.004, 0.002, 15, 100, 0.01] + [0, 0.004, 50, 1000, 0]
+        frames[ticker] = pd.DataFrame(X, index=index, columns=INDICATOR_COLS).assign(Close=1000 + X[:, 3])
+    return frames
+
+def lstm_latency(path, calls=CALLS):
+    scorer = LSTMScorer.load(path)
+    frames = sample_frames(SEED_BARS + 2 + calls)
+    window = lambda end: {t: df.iloc[:end] for t, df in frames.items()}
+    start = SEED_BARS + 2
+    scorer.predict_many(window(start)) # Seeds every ticker's state
+    cached, rerun = [], []
+    for end in range(start + 1, start + 1 + calls):
+        # Steady state: one new closed candle per ticker since the last call
+        step = window(end)
+        t = time.perf_counter()
+        scorer.predict_many(step)
+        cached.append((time.perf_counter() - t) * 1e6)
+        # Baseline: rebuild the state from the whole window every call
+        scorer.states.clear()
+        t = time.perf_counter()
+        scorer.predict_many(step)
+        rerun.append((time.perf_counter() - t) * 1e6)
+    return scorer, np.percentile(cached, 50), np.percentile(cached, 99), np.percentile(rerun, 50)
+
+if __name__ == "__main__":
+    for ticker in TICKERS:
+        model = joblib.load(f"model_{ticker}.pkl")
+        kernel = CompactForest.from_model(model)
+
+        X = sample_features(5000)
+        exact = np.array_equal(model.predict_proba(X), kernel.predict_proba(X))
+        print(f"\n🌲 {ticker}: {kernel.n_estimators} trees, depth {kernel.max_depth} | parity {'✅ exact' if exact else '❌ MISMATCH'}")
+
+        for rows in [1, 4, 1000]:
+            X = sample_features(rows, seed=rows)
+            calls = CALLS if rows < 1000 else 30
+            sk50, sk99 = latency(model.predict_proba, X, calls)
+            k50, k99 = latency(kernel.predict_proba, X, calls)
+            print(f"  {rows:>5} rows | sklearn p50 {sk50:>8.0f}µs p99 {sk99:>8.0f}µs | kernel p50 {k50:>8.0f}µs p99 {k99:>8.0f}µs | {sk50 / k50:>5.1f}x")
+
+    for path in sorted(glob.glob("lstm*.pth")):
+        scorer, c50, c99, r50 = lstm_latency(path)
+        print(f"\n🧬 {path}: {len(scorer.layers)} layers x {scorer.hidden} units | {len(TICKERS)} tickers per batch")
+        print(f"  cached state p50 {c50:>8.0f}µs p99 {c99:>8.0f}µs | full {SEED_BARS}-bar re-run p50 {r50:>8.0f}µs | {r50 / c50:>5.1f}x")
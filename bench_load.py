@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import contextlib
+import functools
+import warnings
+import numpy as np
+import uvicorn
+from eth_account import Account
+
+# Offline load test of the whole x402 loop: 402 -> pay -> verify -> signal.
+# Every external dependency is a local stand-in with injected latency:
+#   RPC node -> fake_rpc.FakeRPC, yfinance + RSS -> fake_market, Gemini -> brain.StubBackend
+# Usage:
+#   python bench_load.py --buyers 100 --llm-latency 0.8 --rpc-latency 0.05
+#   python bench_load.py --uncached --max-p95 signal=1500   # exits 1 on regression (CI)
+warnings.filterwarnings("ignore")
+
+from fake_market import use_offline_stack
+import main
+import model
+import brain
+import buyer
+from forest import CompactForest
+from lstm import LSTMScorer
+
+STAGE_ORDER = ["verify", "data_fetch", "indicators", "model", "lstm", "llm", "portfolio_write",
+               "negotiate", "pay", "confirm_wait", "signal", "buyer_total"]
+
+class StageTimer:
+    """Wraps functions in place and records wall time per stage (sync or async)."""
+    def __init__(self):
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self.lock: self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, owner, name, stage):
+        fn = getattr(owner, name)
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try: return await fn(*args, **kwargs)
+                finally: self.record(stage, time.perf_counter() - start)
+        else:
+            @functools.wraps(fn)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try: return fn(*args, **kwargs)
+                finally: self.record(stage, time.perf_counter() - start)
+        setattr(owner, name, timed)
+
+    def report(self):
+        out = {}
+        for stage in STAGE_ORDER + sorted(set(self.samples) - set(STAGE_ORDER)):
+            values = self.samples.get(stage)
+            if not values: continue
+            ms = np.array(values) * 1000
+            out[stage] = {"count": len(ms), "p50": np.percentile(ms, 50), "p95": np.percentile(ms, 95),
+                          "p99": np.percentile(ms, 99), "max": ms.max()}
+        return out
+
+def setup(args, workdir, timer):
+    """Points the app at the stand-ins and instruments the server-side stages."""
+    # Fresh state per run: nothing from portfolio.db / payments.db leaks into the numbers
+    rpc, market, news = use_offline_stack(workdir, rpc_latency=args.rpc_latency, block_time=args.block_time, data_latency=args.data_latency,
+                                          news_latency=args.news_latency, llm_latency=args.llm_latency, watch_poll=args.watch_poll)
+
+    if args.uncached:
+        # Every request runs the full pipeline: new candle delta, no signal / decision reuse
+        ticks = iter(range(10**9))
+        model.bar_floor = lambda interval="15m": model.pd.Timestamp.now(tz="UTC").floor("15min") + model.pd.Timedelta(next(ticks), "ns")
+        main.predictor.signal_cache.get_or_compute = lambda key, compute, keep=None: compute()
+        main.llm_brain.cache = brain.DecisionCache(ttl=0)
+
+    timer.wrap(main.payments, "check", "verify")
+    timer.wrap(model.DataProcessor, "fetch_fleet_data", "data_fetch")
+    timer.wrap(model.DataProcessor, "add_indicators", "indicators")
+    timer.wrap(model.DataProcessor, "extend_indicators", "indicators")
+    timer.wrap(CompactForest, "predict_proba", "model")
+    timer.wrap(LSTMScorer, "predict_many", "lstm")
+    timer.wrap(brain.Brain, "get_decision", "llm")
+    timer.wrap(brain.Brain, "get_decisions", "llm")
+    timer.wrap(model.PortfolioManager, "check_exit", "portfolio_write")
+    timer.wrap(model.PortfolioManager, "execute_buy", "portfolio_write")
+    return rpc, market, news
+
+async def run_buyer(client, key, timer, fleet, ticker=None):
+    start = time.perf_counter()
+    path = "/signal?fleet=true" if fleet else f"/signal?ticker={ticker}" if ticker else "/signal"
+    http = client.http()
+
+    async def signal(headers):
+        t = time.perf_counter()
+        async with http.get(client.api_url + path, headers=headers) as resp:
+            body = await resp.read()
+            timer.record("signal" if resp.status == 200 else "confirm_wait", time.perf_counter() - t)
+            return resp.status, resp.headers, body
+
+    t = time.perf_counter()
+    status, headers, _ = await signal({})
+    timer.record("negotiate", time.perf_counter() - t)
+    if status != 402: return f"expected 402, got {status}"
+
+    t = time.perf_counter()
+    tx_hash = await client.pay(key, headers["x-402-address"], int(headers["x-402-price"]), headers["x-402-token"])
+    timer.record("pay", time.perf_counter() - t)
+
+    for _ in range(buyer.PROOF_RETRIES * 4):
+        status, headers, body = await signal({"Authorization": tx_hash})
+        if status == 200:
+            timer.record("buyer_total", time.perf_counter() - start)
+            return None
+        if status != 202: return f"HTTP {status}: {body[:80]!r}"
+        await asyncio.sleep(float(headers.get("Retry-After", 1)) / 4)
+    return "never confirmed"
+
+async def drive(args, timer):
+    client = buyer.AgentClient(api_url=f"http://127.0.0.1:{args.port}", rpc_url=main.payments.rpc.rpc_url)
+    keys = [Account.create().key for _ in range(args.wallets)]
+    tasks = []
+    start = time.perf_counter()
+    for i in range(args.buyers):
+        ticker = args.assets[i % len(args.assets)] if args.assets else None
+        tasks.append(asyncio.ensure_future(run_buyer(client, keys[i % len(keys)], timer, args.fleet, ticker)))
+        if args.rate: await asyncio.sleep(1 / args.rate)
+    errors = [e for e in await asyncio.gather(*tasks) if e]
+    elapsed = time.perf_counter() - start
+    await client.close()
+    return elapsed, errors
+
+def print_report(args, elapsed, errors, stages, rpc, market, news):
+    delivered = args.buyers - len(errors)
+    print(f"\n⚡ {delivered}/{args.buyers} buyers served in {elapsed:.2f}s -> {delivered / elapsed:.1f} signals/s"
+          f" ({'uncached' if args.uncached else 'cached'}, {'fleet' if args.fleet else 'single'})")
+    print(f"   stand-ins: rpc {rpc.requests} http / {rpc.calls} calls | yfinance {market.calls} | rss {news.requests}")
+    print(f"\n   {'stage':<16}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, s in stages.items():
+        print(f"   {stage:<16}{s['count']:>7}{s['p50']:>10.1f}{s['p95']:>10.1f}{s['p99']:>10.1f}{s['max']:>10.1f}")
+    for error in sorted(set(errors))[:5]: print(f"   ❌ {error}")
+
+def check_budgets(budgets, stages):
+    failed = []
+    for budget in budgets:
+        stage, limit = budget.split("=")
+        p95 = stages.get(stage, {}).get("p95")
+        if p95 is not None and p95 > float(limit): failed.append(f"{stage} p95 {p95:.1f}ms > {limit}ms")
+    return failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline x402 load benchmark")
+    parser.add_argument("--buyers", type=int, default=50)
+    parser.add_argument("--wallets", type=int, default=10, help="Buyers share wallets round-robin (exercises nonce management)")
+    parser.add_argument("--rate", type=float, default=0, help="Buyer arrivals per second (0 = all at once)")
+    parser.add_argument("--fleet", action="store_true", help="Buy fleet scans instead of single signals")
+    parser.add_argument("--assets", nargs="+", help="Buyers request these tickers round-robin (per-request ?ticker=)")
+    parser.add_argument("--uncached", action="store_true", help="Bypass candle/signal/decision reuse so every request runs every stage")
+    parser.add_argument("--rpc-latency", type=float, default=0.05)
+    parser.add_argument("--block-time", type=float, default=2.0)
+    parser.add_argument("--watch-poll", type=float, default=0.5)
+    parser.add_argument("--data-latency", type=float, default=0.3)
+    parser.add_argument("--news-latency", type=float, default=0.2)
+    parser.add_argument("--llm-latency", type=float, default=0.8)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--max-p95", action="append", default=[], metavar="STAGE=MS", help="Fail (exit 1) if a stage's p95 exceeds MS")
+    parser.add_argument("--verbose", action="store_true", help="Keep the server's per-request prints")
+    args = parser.parse_args()
+
+    timer = StageTimer()
+    workdir = tempfile.mkdtemp(prefix="bench_load_")
+    rpc, market, news = setup(args, workdir, timer)
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=args.port, log_level="warning"))
+    threading.Thread(target=server.run, name="bench-server", daemon=True).start()
+    while not server.started: time.sleep(0.05)
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with quiet: elapsed, errors = asyncio.run(drive(args, timer))
+    server.should_exit = True
+
+    stages = timer.report()
+    print_report(args, elapsed, errors, stages, rpc, market, news)
+    failed = check_budgets(args.max_p95, stages)
+    for line in failed: print(f"   🚨 {line}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"buyers": args.buyers, "errors": errors, "seconds": elapsed, "stages": stages}, f, indent=2)
+    sys.exit(1 if errors or failed else 0)
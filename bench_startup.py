@@ -0,0 +1,66 @@
+import os
+import sys
+import json
+import subprocess
+
+# Cold-start benchmark: each case runs in a fresh interpreter so imports and page cache
+# effects are measured the way a new uvicorn worker sees them.
+# The compact (flat-array) format is what the first load of each ticker exports (ModelFleet,
+# also train_fleet.py); if it is missing, a warm-up run of that first load produces it.
+
+TICKERS = ["BTC-USD", "ETH-USD", "SOL-USD", "DOGE-USD"]
+
+CASES = {
+    "import model (server cold start)": """
+import model
+""",
+    "eager joblib.load x4 (old startup)": """
+import joblib
+models = [joblib.load(f"model_{t}.pkl") for t in TICKERS]
+""",
+    "joblib.load x4, mmap_mode='r'": """
+import joblib
+models = [joblib.load(f"model_{t}.pkl", mmap_mode="r") for t in TICKERS]
+""",
+    "compact forest x4, mmap_mode='r'": """
+from forest import CompactForest, compact_path
+models = [CompactForest.load(compact_path(t), mmap_mode="r") for t in TICKERS]
+""",
+}
+
+RUNNER = """
+import time, resource, json
+TICKERS = {tickers}
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+WARM_UP = """
+from model import ModelFleet
+fleet = ModelFleet(TICKERS)
+for t in fleet: fleet.get(t)
+"""
+
+def run_case(body):
+    code = RUNNER.format(tickers=TICKERS, body=body)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if out.returncode != 0: return None
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    has_compact = all(os.path.isdir(f"model_{t}.forest") for t in TICKERS)
+    if not has_compact:
+        print("🔥 Warm-up: first fleet load exports the compact forests")
+        has_compact = run_case(WARM_UP) is not None and all(os.path.isdir(f"model_{t}.forest") for t in TICKERS)
+    print(f"{'CASE':<38} {'TIME':>9} {'MAX RSS':>10}")
+    for name, body in CASES.items():
+        if "compact" in name and not has_compact:
+            print(f"{name:<38} {'skipped (warm-up failed)':>20}")
+            continue
+        result = run_case(body)
+        if result is None:
+            print(f"{name:<38} {'failed':>9}")
+            continue
+        print(f"{name:<38} {result['seconds'] * 1000:>7.0f}ms {result['max_rss_mb']:>8.1f}MB")
@@ -1,55 +1,294 @@
-import google.generativeai as genai
 import json
 import os
+import re
+import time
+import hashlib
+import calendar
+import threading
+import urllib.error
+import urllib.request
 import feedparser
+from collections import OrderedDict
+from concurrent.futures import Future
+from metrics import timed
 
 # ⚠️ KEEP YOUR KEY HERE
 GEMINI_API_KEY = "YOUR_API_KEY_HERE"
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini") # "stub" = offline rule-based replies
+DECISION_TTL = 900          # Reuse an identical decision for up to 15 minutes (one bar)
+DECISION_CACHE_SIZE = 512
+BATCH_WINDOW = float(os.environ.get("LLM_BATCH_WINDOW", "0")) # Seconds to gather tickers per prompt (0 = off)
+BATCH_MAX = 8
 
-class Brain:
-    def __init__(self):
+# --- NEWS FEED (Polled in the background, read from memory) ---
+NEWS_URL = "https://www.coindesk.com/arc/outboundfeeds/rss/"
+NEWS_POLL_SECONDS = 120
+NEWS_TTL = 6 * 3600   # Headlines older than this are dropped
+NEWS_MAX_ITEMS = 200
+NEWS_TIMEOUT = 10.0   # Socket timeout for one feed fetch (poller thread only)
+TICKER_KEYWORDS = {
+    "BTC-USD": ["bitcoin", "btc"],
+    "ETH-USD": ["ethereum", "ether", "eth"],
+    "SOL-USD": ["solana", "sol"],
+    "DOGE-USD": ["dogecoin", "doge"],
+}
+
+class NewsFeed:
+    def __init__(self, url=NEWS_URL, ttl=NEWS_TTL, max_items=NEWS_MAX_ITEMS):
+        self.url = url
+        self.ttl = ttl
+        self.max_items = max_items
+        self.items = {}       # dedupe key -> {"title", "text", "published"}
+        self.etag = None
+        self.modified = None
+        self.polled = False   # At least one successful poll
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def dedupe_key(self, entry):
+        # Same story re-published with a new guid still has the same title
+        return re.sub(r"\W+", " ", entry.get("title", "")).strip().lower()
+
+    def download(self):
+        # Conditional GET with a socket timeout (feedparser's own fetch has none): None = 304 unchanged
+        headers = {}
+        if self.etag: headers["If-None-Match"] = self.etag
+        if self.modified: headers["If-Modified-Since"] = self.modified
         try:
-            genai.configure(api_key=GEMINI_API_KEY)
-            # Use Stable Flash
-            self.model = genai.GenerativeModel('gemini-flash-latest')
-        except Exception as e:
-            print(f"❌ Gemini Connection Failed: {e}")
-            self.model = None
+            with urllib.request.urlopen(urllib.request.Request(self.url, headers=headers), timeout=NEWS_TIMEOUT) as resp:
+                return resp.read(), resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+        except urllib.error.HTTPError as e:
+            if e.code == 304: return None
+            raise
+
+    @timed("news_poll")
+    def poll(self):
+        fetched = self.download()
+        if fetched is None:
+            self.polled = True
+            return 0
+        body, etag, modified = fetched
+        feed = feedparser.parse(body)
+        if not feed.entries:
+            if feed.get("bozo"): raise RuntimeError(feed.get("bozo_exception", "unreadable feed"))
+            return 0
+
+        added = 0
+        now = time.time()
+        with self.lock:
+            self.etag, self.modified = etag, modified
+            for entry in feed.entries:
+                key = self.dedupe_key(entry)
+                if not key or key in self.items: continue
+                published = entry.get("published_parsed")
+                self.items[key] = {
+                    "title": entry.title,
+                    "text": f"{entry.title} {entry.get('summary', '')}".lower(),
+                    "published": calendar.timegm(published) if published else now
+                }
+                added += 1
+            self.evict(now)
+            self.polled = True
+        return added
+
+    def evict(self, now):
+        fresh = sorted((i for i in self.items.items() if now - i[1]["published"] <= self.ttl), key=lambda i: -i[1]["published"])
+        self.items = dict(fresh[:self.max_items])
+
+    def start(self, every=NEWS_POLL_SECONDS):
+        if self.thread: return
+        def loop():
+            while True:
+                try: self.poll()
+                except Exception as e: print(f"⚠️ News poll failed: {e}")
+                time.sleep(every)
+        self.thread = threading.Thread(target=loop, name="news-poller", daemon=True)
+        self.thread.start()
+
+    def relevant(self, item, ticker):
+        words = TICKER_KEYWORDS.get(ticker, [ticker.split("-")[0].lower()])
+        return any(re.search(rf"\b{re.escape(w)}\b", item["text"]) for w in words)
+
+    def headlines(self, ticker=None, n=2):
+        """Top n headlines, those mentioning the ticker first, topped up with general market news."""
+        with self.lock:
+            items = sorted(self.items.values(), key=lambda i: -i["published"])
+        picks = [i for i in items if ticker and self.relevant(i, ticker)][:n]
+        picks += [i for i in items if i not in picks][:n - len(picks)]
+        return [i["title"] for i in picks]
+
+news_feed = NewsFeed()
+
+# --- LLM BACKENDS (generate(prompt) -> reply text) ---
+class GeminiBackend:
+    def __init__(self):
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+        # Use Stable Flash
+        self.model = genai.GenerativeModel('gemini-flash-latest')
+
+    @timed("llm_generate")
+    def generate(self, prompt):
+        return self.model.generate_content(prompt).text
+
+class StubBackend:
+    """Offline stand-in: follows the ML vote, replies in the same JSON shapes as Gemini."""
+    BLOCK = re.compile(r"(?:Analyze |\[)([A-Z0-9]+-[A-Z]+)(?: data:|\])\s*- ML Prediction: (\w+) \(([\d.]+)%\)")
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
 
+    @timed("llm_generate")
+    def generate(self, prompt):
+        self.calls += 1
+        if self.latency: time.sleep(self.latency)
+        replies = {}
+        for ticker, ml_signal, ml_conf in self.BLOCK.findall(prompt):
+            conf = float(ml_conf)
+            signal = ml_signal if ml_signal in ("BUY", "SELL") and conf >= 55 else "WAIT"
+            replies[ticker] = {"signal": signal, "confidence": round(conf), "reasoning": f"Stub: ML says {ml_signal} at {conf}%."}
+        if "PER-ASSET" in prompt: return json.dumps(replies)
+        return json.dumps(next(iter(replies.values()), {"signal": "WAIT", "confidence": 0, "reasoning": "Stub: no data"}))
+
+# --- DECISION CACHE (Same market packet + same news -> same answer) ---
+def fingerprint(market_data, news):
+    # Rounded so noise in the 4th decimal doesn't defeat the cache
+    packet = {
+        "ticker": market_data.get("ticker"),
+        "risk_mode": market_data.get("risk_mode", "BALANCED"),
+        "ml_signal": market_data.get("ml_signal"),
+        "ml_conf": round(float(market_data.get("ml_conf", 0))),
+        "rsi": round(float(market_data.get("rsi", 0))),
+        "momentum": round(float(market_data.get("momentum", 0)), 3),
+        "volatility": round(float(market_data.get("volatility", 0)), 3),
+        "news": news
+    }
+    return hashlib.sha1(json.dumps(packet, sort_keys=True).encode()).hexdigest()
+
+class DecisionCache:
+    """LRU of LLM decisions with a TTL."""
+    def __init__(self, ttl=DECISION_TTL, max_entries=DECISION_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, count=True):
+        # count=False: a re-check of a key whose lookup was already counted
+        with self.lock:
+            item = self.entries.get(key)
+            if item and time.time() - item[1] <= self.ttl:
+                self.entries.move_to_end(key)
+                if count: self.hits += 1
+                return dict(item[0])
+            if item: del self.entries[key]
+            if count: self.misses += 1
+            return None
+
+    def put(self, key, decision):
+        with self.lock:
+            self.entries[key] = (dict(decision), time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries: self.entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0, "entries": len(self.entries)}
+
+# --- DECISION BATCHER (Concurrent tickers -> one prompt) ---
+class DecisionBatcher:
+    def __init__(self, brain, window=BATCH_WINDOW, max_batch=BATCH_MAX):
+        self.brain = brain
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = []
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self.loop, name="llm-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, market_data, news):
+        future = Future()
+        with self.cond:
+            self.pending.append((market_data, news, future))
+            self.cond.notify()
+        return future
+
+    def take(self):
+        # One entry per ticker per prompt; repeats wait for the next batch
+        batch, rest, seen = [], [], set()
+        for item in self.pending:
+            ticker = item[0].get("ticker")
+            if ticker in seen or len(batch) >= self.max_batch: rest.append(item)
+            else:
+                seen.add(ticker)
+                batch.append(item)
+        self.pending = rest
+        return batch
+
+    def loop(self):
+        while True:
+            with self.cond:
+                while not self.pending: self.cond.wait()
+            time.sleep(self.window) # Let other tickers join this prompt
+            with self.cond: batch = self.take()
+            try:
+                # get_decision already counted these lookups; run_batch only re-checks for
+                # answers an earlier batch cached while they waited
+                decisions = self.brain.run_batch([(m, n) for m, n, f in batch], counted=True)
+                for (market_data, news, future), decision in zip(batch, decisions): future.set_result(decision)
+            except Exception as e:
+                for _, _, future in batch: future.set_exception(e)
+
+class Brain:
+    def __init__(self, backend=None):
+        # Backend is set up on the first decision, not at import, so the server binds fast
+        self.model = backend
+        self.connected = backend is not None
+        self.lock = threading.Lock()
+        self.cache = DecisionCache()
+        self.batcher = None
+
+    def connect(self):
+        with self.lock:
+            if self.connected: return self.model
+            try:
+                self.model = StubBackend() if LLM_BACKEND == "stub" else GeminiBackend()
+            except Exception as e:
+                print(f"❌ Gemini Connection Failed: {e}")
+                self.model = None
+            self.connected = True
+            return self.model
+
+    @timed("fetch_news")
     def fetch_news(self, ticker="BTC-USD"):
         """
-        Scrapes CoinDesk. Accepts 'ticker' argument to match model.py calls.
+        CoinDesk headlines for 'ticker', served from the background poller's memory.
+        Never touches the network: callers may be on the event loop.
         """
-        try:
-            # CoinDesk RSS Feed
-            feed = feedparser.parse("https://www.coindesk.com/arc/outboundfeeds/rss/")
-            if feed.entries:
-                # Get top 2 headlines
-                headlines = [entry.title for entry in feed.entries[:2]]
-                return " | ".join(headlines)
-            return "No news data available."
-        except:
-            return "Newsfeed offline."
+        news_feed.start()
+        if not news_feed.polled: return "Newsfeed offline." # Until the poller's first successful fetch
+        # Get top 2 headlines
+        headlines = news_feed.headlines(ticker, n=2)
+        if headlines: return " | ".join(headlines)
+        return "No news data available."
 
-    def get_decision(self, market_data):
-        if not self.model:
-            return {"signal": "WAIT", "reasoning": "Brain Offline", "confidence": 0}
-
-        # 1. Fetch News (Using the ticker passed in market_data)
-        ticker = market_data.get('ticker', 'BTC-USD')
-        news_headlines = self.fetch_news(ticker)
-        
-        print(f"📰 INTEL ACQUIRED: {news_headlines[:50]}...")
-
-        prompt = f"""
-        Act as a crypto trading node. Analyze {ticker} data:
-        
+    def prompt_block(self, market_data, header):
+        return f"""
+        {header}
         - ML Prediction: {market_data['ml_signal']} ({market_data['ml_conf']}%)
         - RSI: {market_data['rsi']}
         - Momentum: {market_data['momentum']}
         - Volatility: {market_data['volatility']}
         - Risk Mode: {market_data.get('risk_mode', 'BALANCED')}
-        
+        """
+
+    def single_prompt(self, market_data, news_headlines):
+        ticker = market_data.get('ticker', 'BTC-USD')
+        return f"""
+        Act as a crypto trading node.{self.prompt_block(market_data, f"Analyze {ticker} data:")}
         🌍 GLOBAL INTEL (NEWS):
         "{news_headlines}"
         
@@ -65,13 +304,84 @@ class Brain:
         {{"signal": "BUY", "confidence": 80, "reasoning": "Short reason citing news if relevant"}}
         """
 
+    def batch_prompt(self, items):
+        blocks = "".join(
+            self.prompt_block(m, f"[{m.get('ticker')}]") + f'        NEWS: "{news}"\n' for m, news in items
+        )
+        return f"""
+        Act as a crypto trading node. Analyze each asset independently (PER-ASSET):
+        {blocks}
+        TASK:
+        Decide BUY, SELL, or WAIT for every asset above.
+        
+        RULES:
+        1. If news is NEGATIVE (hacks, bans, SEC), bias towards SELL/WAIT.
+        2. If news is POSITIVE (ETF, adoption), bias towards BUY.
+        3. News momentum can override technicals.
+        
+        Reply with VALID JSON ONLY, one key per asset:
+        {{"BTC-USD": {{"signal": "BUY", "confidence": 80, "reasoning": "Short reason citing news if relevant"}}}}
+        """
+
+    def parse(self, text):
+        clean_text = text.replace("```json", "").replace("```", "").strip()
+        return json.loads(clean_text)
+
+    @timed("get_decision")
+    def get_decision(self, market_data):
+        if not self.connect():
+            return {"signal": "WAIT", "reasoning": "Brain Offline", "confidence": 0}
+
+        # 1. Fetch News (Using the ticker passed in market_data)
+        ticker = market_data.get('ticker', 'BTC-USD')
+        news_headlines = self.fetch_news(ticker)
+        
+        print(f"📰 INTEL ACQUIRED: {news_headlines[:50]}...")
+
+        key = fingerprint(market_data, news_headlines)
+        cached = self.cache.get(key)
+        if cached: return cached
+
+        if BATCH_WINDOW > 0:
+            if self.batcher is None: self.batcher = DecisionBatcher(self)
+            try: return self.batcher.submit(market_data, news_headlines).result()
+            except Exception as e:
+                print(f"🔴 GEMINI ERROR: {e}")
+                return {"signal": "WAIT", "reasoning": "API Error", "confidence": 0}
+
         try:
-            response = self.model.generate_content(prompt)
-            clean_text = response.text.replace("```json", "").replace("```", "").strip()
-            return json.loads(clean_text)
+            decision = self.parse(self.model.generate(self.single_prompt(market_data, news_headlines)))
+            self.cache.put(key, decision)
+            return decision
             
         except Exception as e:
             print(f"🔴 GEMINI ERROR: {e}")
             return {"signal": "WAIT", "reasoning": "API Error", "confidence": 0}
 
+    @timed("get_decisions")
+    def get_decisions(self, packets):
+        """Decisions for several tickers; cache misses share ONE prompt."""
+        if not self.connect():
+            return [{"signal": "WAIT", "reasoning": "Brain Offline", "confidence": 0} for _ in packets]
+        items = [(m, self.fetch_news(m.get('ticker', 'BTC-USD'))) for m in packets]
+        try: return self.run_batch(items)
+        except Exception as e:
+            print(f"🔴 GEMINI ERROR: {e}")
+            return [{"signal": "WAIT", "reasoning": "API Error", "confidence": 0} for _ in packets]
+
+    def run_batch(self, items, counted=False):
+        decisions = [self.cache.get(fingerprint(m, news), count=not counted) for m, news in items]
+        missing = [i for i, d in enumerate(decisions) if d is None]
+        if missing:
+            replies = self.parse(self.model.generate(self.batch_prompt([items[i] for i in missing])))
+            for i in missing:
+                market_data, news = items[i]
+                reply = replies.get(market_data.get('ticker')) if isinstance(replies, dict) else None
+                if not isinstance(reply, dict) or "signal" not in reply:
+                    decisions[i] = {"signal": "WAIT", "reasoning": "No reply for asset", "confidence": 0}
+                    continue
+                self.cache.put(fingerprint(market_data, news), reply)
+                decisions[i] = reply
+        return decisions
+
 llm_brain = Brain()
\ No newline at end of file
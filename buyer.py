@@ -1,81 +1,135 @@
-import time
-import requests
-from web3 import Web3
+import sys
+import asyncio
+import aiohttp
 from eth_account import Account
+from payments import RpcBatcher, TRANSFER_SELECTOR
 
 # --- CONFIG ---
 API_URL = "http://127.0.0.1:8000"
 RPC_URL = "https://sepolia.base.org"
 USDC_CONTRACT = "0x036CbD53842c5426634e7929541eC2318f3dCF7e"
+CHAIN_ID = 84532
+TRANSFER_GAS = 100000
 
 # ⚠️ PASTE YOUR PRIVATE KEY HERE
 PRIVATE_KEY = "YOUR_PRIVATE_KEY_HERE"
-MY_ADDRESS = "0xb2984A80Bcb06Dbe7c1f9849949B8c02A71fbE48"
 
-w3 = Web3(Web3.HTTPProvider(RPC_URL))
+PROOF_RETRIES = 20
+PROOF_INTERVAL = 3.0 # Used when the server doesn't send Retry-After
+POOL_SIZE = 100      # Keep-alive connections shared by every agent in the process
 
-def log(action, message):
-    """Sends status to the Dashboard"""
-    print(f"[{action}] {message}") 
-    try:
-        requests.post(f"{API_URL}/log", json={
-            "source": "Agent-007",
-            "action": action,
-            "message": str(message)
-        })
-    except:
-        print("⚠️ Dashboard offline (Server not running?)")
+class NonceManager:
+    """Hands out sequential nonces per wallet so concurrent agents never collide.
+
+    The chain is asked once (pending count); later nonces are counted locally.
+    A failed broadcast drops the local counter so the next reservation resyncs.
+    """
+    def __init__(self, rpc):
+        self.rpc = rpc
+        self.next = {}
+        self.locks = {}
+
+    async def reserve(self, address):
+        lock = self.locks.setdefault(address, asyncio.Lock())
+        async with lock:
+            if address not in self.next:
+                self.next[address] = int(await self.rpc.call("eth_getTransactionCount", [address, "pending"]), 16)
+            nonce = self.next[address]
+            self.next[address] += 1
+            return nonce
+
+    def reset(self, address):
+        self.next.pop(address, None)
+
+class AgentClient:
+    """Pooled HTTP client for the API and the chain, shared by every agent in the process."""
+    def __init__(self, api_url=API_URL, rpc_url=RPC_URL, log_sink=None):
+        self.api_url = api_url
+        self.rpc = RpcBatcher(rpc_url) # gas price / nonce / broadcast calls from concurrent agents share batches
+        self.nonces = NonceManager(self.rpc)
+        self.log_sink = log_sink # In-process runs write logs directly instead of POSTing to ourselves (async callable)
+        self.session = None
+
+    def http(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=POOL_SIZE), timeout=aiohttp.ClientTimeout(total=30))
+        return self.session
+
+    async def close(self):
+        if self.session is not None: await self.session.close()
+        if self.rpc.session is not None: await self.rpc.session.close()
+
+    async def log(self, source, action, message):
+        """Sends status to the Dashboard"""
+        print(f"[{source}] [{action}] {message}")
+        entry = {"source": source, "action": action, "message": str(message)}
+        if self.log_sink is not None: return await self.log_sink(entry)
+        try:
+            async with self.http().post(f"{self.api_url}/log", json=entry) as resp: await resp.read()
+        except Exception:
+            print("⚠️ Dashboard offline (Server not running?)")
+
+    async def get_signal(self, tx_hash=None, ticker=None, risk=None):
+        headers = {"Authorization": tx_hash} if tx_hash else {}
+        # Unset -> the server's defaults (/set_asset, /set_risk)
+        params = {k: v for k, v in (("ticker", ticker), ("risk", risk)) if v is not None}
+        async with self.http().get(f"{self.api_url}/signal", headers=headers, params=params) as resp:
+            body = await resp.json(content_type=None) if resp.status in (200, 202) else None
+            return resp.status, resp.headers, body
+
+    async def pay(self, private_key, seller, amount, token=USDC_CONTRACT):
+        """Signs and broadcasts a USDC transfer(seller, amount). Returns the tx hash."""
+        account = Account.from_key(private_key)
+        gas_price = asyncio.ensure_future(self.rpc.call("eth_gasPrice", []))
+        nonce = await self.nonces.reserve(account.address)
+        data = TRANSFER_SELECTOR + seller.lower().replace("0x", "").rjust(64, "0") + hex(amount)[2:].rjust(64, "0")
+        txn = {
+            'chainId': CHAIN_ID, 'gas': TRANSFER_GAS, 'gasPrice': int(await gas_price, 16),
+            'nonce': nonce, 'to': token, 'value': 0, 'data': data
+        }
+        signed = Account.sign_transaction(txn, private_key)
+        try: tx_hash = await self.rpc.call("eth_sendRawTransaction", ["0x" + bytes(signed.raw_transaction).hex()])
+        except Exception:
+            self.nonces.reset(account.address)
+            raise
+        return tx_hash or "0x" + bytes(signed.hash).hex()
+
+async def run_agent_async(client, name="Agent-007", private_key=PRIVATE_KEY, pacing=1.0, ticker=None, risk=None):
+    log = lambda action, message: client.log(name, action, message)
+    await log("START", "Initializing Autonomous Agent...")
+    await asyncio.sleep(pacing)
+
+    await log("WAIT", "Scanning market volatility...")
+    await asyncio.sleep(pacing)
 
-def run_agent():
-    log("START", "Initializing Autonomous Agent...")
-    time.sleep(1)
-    
-    log("WAIT", "Scanning market volatility...")
-    time.sleep(1)
-    
     try:
         # 1. Negotiate
-        log("NEGOTIATE", "Requesting /signal from Market API...")
-        resp = requests.get(f"{API_URL}/signal")
-        
-        if resp.status_code == 402:
-            log("NETWORK", "⚠️ HTTP 402: PAYMENT REQUIRED detected.")
-            
-            price = int(resp.headers['x-402-price'])
-            seller = resp.headers['x-402-address']
-            
-            log("BUY", f"Contract: {price/1_000_000} USDC. Signing transaction...")
-            
+        await log("NEGOTIATE", "Requesting /signal from Market API...")
+        status, headers, _ = await client.get_signal(ticker=ticker, risk=risk)
+
+        if status == 402:
+            await log("NETWORK", "⚠️ HTTP 402: PAYMENT REQUIRED detected.")
+
+            price = int(headers['x-402-price'])
+            seller = headers['x-402-address']
+            token = headers.get('x-402-token', USDC_CONTRACT)
+
+            await log("BUY", f"Contract: {price/1_000_000} USDC. Signing transaction...")
+
             # 2. Pay
-            usdc = w3.eth.contract(address=USDC_CONTRACT, abi=[
-                {"constant":False,"inputs":[{"name":"_to","type":"address"},{"name":"_value","type":"uint256"}],"name":"transfer","outputs":[{"name":"","type":"bool"}],"payable":False,"stateMutability":"nonpayable","type":"function"}
-            ])
-            
-            txn = usdc.functions.transfer(seller, price).build_transaction({
-                'chainId': 84532, 
-                'gas': 100000,
-                'gasPrice': w3.eth.gas_price,
-                'nonce': w3.eth.get_transaction_count(MY_ADDRESS),
-            })
-            
-            signed_txn = w3.eth.account.sign_transaction(txn, private_key=PRIVATE_KEY)
-            try: raw_bytes = signed_txn.rawTransaction
-            except AttributeError: raw_bytes = signed_txn.raw_transaction
-            
-            tx_hash = w3.eth.send_raw_transaction(raw_bytes).hex()
-            log("TX_SENT", f"Broadcasted: {tx_hash[:10]}...")
-            
+            tx_hash = await client.pay(private_key, seller, price, token)
+            await log("TX_SENT", f"Broadcasted: {tx_hash[:10]}...")
+
             # 3. Verify & Report
-            log("VERIFY", "Waiting for block confirmation...")
-            
-            for i in range(20): 
-                time.sleep(3)
-                proof_resp = requests.get(f"{API_URL}/signal", headers={"Authorization": tx_hash})
-                
-                if proof_resp.status_code == 200:
-                    data = proof_resp.json()['data']
+            await log("VERIFY", "Waiting for block confirmation...")
+
+            for i in range(PROOF_RETRIES):
+                status, headers, body = await client.get_signal(tx_hash, ticker, risk)
+
+                if status == 200:
+                    data = body['data']
                     details = data.get('details', {})
-                    
+
                     # EXTRACT DATA
                     signal = data['signal']
                     conf = data['confidence']
@@ -84,25 +138,65 @@ def run_agent():
                     mom = details.get('Momentum', '0.00')
                     vol = details.get('Volatility', '0.00')
                     asset = details.get('Asset', 'BTC')
-                    
+
                     # NEW: Get Portfolio Stats (This fixes the PnL Table)
                     pnl = details.get('PnL', 0.0)
                     equity = details.get('Equity', 0.0)
-                    
+
                     # NEW: Get News
                     news = details.get('News', 'No Intel')
                     short_news = (news[:50] + '..') if len(news) > 50 else news
-                    
+
                     # FORMAT LOG STRING (Now includes PnL and Equity)
                     log_msg = f"{signal} ({conf}%) | \"{reasoning}\" | RSI:{rsi} | MOM:{mom} | VOL:{vol} | Asset:{asset} | PnL:{pnl} | Eq:{equity} | NEWS:{short_news}"
-                    
-                    log("DELIVERED", log_msg)
-                    break
-                else:
-                    log("WAIT", "Verifying payment...")
-                    
+
+                    await log("DELIVERED", log_msg)
+                    return data
+                if status in (403, 409):
+                    await log("ERROR", f"Payment rejected (HTTP {status})")
+                    return None
+                await log("WAIT", "Verifying payment...")
+                await asyncio.sleep(float(headers.get('Retry-After', PROOF_INTERVAL)))
+
     except Exception as e:
-        log("ERROR", f"Agent Crashed: {str(e)}")
+        await log("ERROR", f"Agent Crashed: {str(e)}")
+
+class AgentRunner:
+    """Drives many buyers concurrently from one process over one pooled client.
+
+    Agents may share a wallet; the client's NonceManager keeps their transactions ordered.
+    """
+    def __init__(self, client=None, private_keys=None, pacing=1.0):
+        self.client = client or AgentClient()
+        self.private_keys = private_keys or [PRIVATE_KEY]
+        self.pacing = pacing
+        self.launched = 0
+        self.tasks = set()
+
+    def agent(self):
+        self.launched += 1
+        name = f"Agent-{self.launched:03d}"
+        key = self.private_keys[(self.launched - 1) % len(self.private_keys)]
+        return run_agent_async(self.client, name, key, self.pacing)
+
+    def submit(self):
+        """Schedules one agent run on the running loop and returns immediately."""
+        task = asyncio.ensure_future(self.agent())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def run(self, n=1):
+        return await asyncio.gather(*[self.agent() for _ in range(n)])
+
+def run_agent():
+    asyncio.run(run_many(1))
+
+async def run_many(n):
+    runner = AgentRunner()
+    try: return await runner.run(n)
+    finally: await runner.client.close()
 
 if __name__ == "__main__":
-    run_agent()
\ No newline at end of file
+    # python buyer.py [N]  -> N concurrent agents
+    asyncio.run(run_many(int(sys.argv[1]) if len(sys.argv) > 1 else 1))
@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import pandas as pd
+
+# --- CANDLE STORE (raw OHLCV on disk, one .npz per ticker/interval) ---
+# Grows by delta downloads, so history accumulates past Yahoo's 60-day 15m window
+# and training / backtests can run offline from the same files.
+CANDLE_DIR = "candles"
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+class CandleStore:
+    def __init__(self, root=CANDLE_DIR):
+        self.root = root
+
+    def path(self, ticker, interval="15m"):
+        return os.path.join(self.root, f"{ticker}_{interval}.npz")
+
+    def load(self, ticker, interval="15m"):
+        path = self.path(ticker, interval)
+        if not os.path.exists(path): return None
+        with np.load(path) as data:
+            index = pd.to_datetime(data["index"], utc=True)
+            return pd.DataFrame({col: data[col] for col in COLUMNS}, index=index)
+
+    def save(self, ticker, df, interval="15m"):
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(ticker, interval)
+        tmp = path + ".tmp.npz"
+        # Write-then-rename so a concurrent reader never sees a half-written file
+        np.savez(tmp, index=df.index.values.astype("datetime64[ns]").astype(np.int64), **{col: df[col].to_numpy(dtype=np.float64) for col in COLUMNS})
+        os.replace(tmp, path)
+
+    def load_many(self, tickers, interval="15m"):
+        frames = {t: self.load(t, interval) for t in tickers}
+        return {t: df for t, df in frames.items() if df is not None}
+
+    def update(self, processor, tickers, interval="15m", period="59d"):
+        """Brings every ticker up to date with batched downloads (full history for new tickers,
+        one delta for the rest). Returns {ticker: candles}."""
+        stored = self.load_many(tickers, interval)
+        missing = [t for t in tickers if t not in stored]
+        fetched = {}
+        if missing: fetched.update(processor.fetch_fleet_data(missing, period=period, interval=interval))
+        if stored:
+            # Re-fetch from the last stored bar: it may have been saved while still forming
+            start = min(df.index[-1] for df in stored.values())
+            fetched.update(processor.fetch_fleet_data(list(stored), interval=interval, start=start))
+
+        frames = {}
+        for t in tickers:
+            old, new = stored.get(t), fetched.get(t)
+            if new is not None:
+                new = new[COLUMNS].astype(np.float64).dropna(subset=["Close"])
+                if new.index.tz is None: new.index = new.index.tz_localize("UTC")
+                df = new if old is None else pd.concat([old, new])
+                df = df[~df.index.duplicated(keep="last")].sort_index()
+                self.save(t, df, interval)
+            else: df = old
+            if df is not None: frames[t] = df
+        return frames
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+from indicators import FEATURE_COLS, INDICATOR_COLS, compute_batch, IndicatorStream
+
+# Parity check: NumPy batch + streaming engines vs the original pandas rolling() implementation.
+# Runs offline on a synthetic 15m random walk (59 days ~ 5,600 candles, like train_fleet.py).
+
+def reference_indicators(df):
+    df['Log_Ret'] = np.log(df['Close'] / df['Close'].shift(1))
+    df['Vol'] = df['Log_Ret'].rolling(window=20).std()
+    delta = df['Close'].diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    rs = gain / loss
+    df['RSI'] = 100 - (100 / (1 + rs))
+    df['SMA_50'] = df['Close'].rolling(window=50).mean()
+    df['Momentum'] = (df['Close'] - df['SMA_50']) / df['SMA_50']
+    df.dropna(inplace=True)
+    return df
+
+rng = np.random.default_rng(42)
+close = 60000 * np.exp(np.cumsum(rng.normal(0, 0.004, 5664)))
+close[100:120] = close[99] # Flat stretch -> exercises the zero-loss RSI edge case
+index = pd.date_range("2025-01-01", periods=len(close), freq="15min", tz="UTC")
+raw = pd.DataFrame({"Close": close, "Volume": rng.integers(1, 1000, len(close))}, index=index)
+
+expected = reference_indicators(raw.copy())
+
+batch = raw.copy()
+for col, values in compute_batch(batch['Close'].values).items(): batch[col] = values
+batch.dropna(inplace=True)
+
+stream = IndicatorStream()
+streamed = raw.copy()
+rows = [stream.update(c) for c in streamed['Close'].values]
+for col in INDICATOR_COLS: streamed[col] = [row[col] for row in rows]
+streamed.dropna(inplace=True)
+
+ok = True
+for name, got in [("batch", batch), ("stream", streamed)]:
+    if not got.index.equals(expected.index):
+        print(f"❌ {name}: row mismatch ({len(got)} vs {len(expected)})")
+        ok = False
+        continue
+    err = np.max(np.abs(got[FEATURE_COLS].values - expected[FEATURE_COLS].values) / (np.abs(expected[FEATURE_COLS].values) + 1e-12))
+    print(f"{'✅' if err < 1e-6 else '❌'} {name}: {len(got)} rows, max relative error {err:.2e}")
+    ok = ok and err < 1e-6
+
+print("✅ PARITY OK" if ok else "❌ PARITY FAILED")
@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import contextlib
+import warnings
+import uvicorn
+from eth_account import Account
+
+# Payment-path checks against the real app on offline stand-ins (fake chain, market, RSS, stub LLM):
+#   - a paid request whose signal fails (cold start during a market data outage) is not
+#     consumed: 503, then the same hash is redeemed once the data is back, and only once
+#   - ?budget= outside (0, SIGNAL_BUDGET] is refused
+#   - a transfer below the x-402-price is refused, not served
+#   - an Authorization value that isn't a tx hash is refused (403), never left pending
+#   - a signal served as a deadline fallback and then recomputed paper-trades at most once
+# Usage:
+#   python check_payments.py    # exits 1 if any check fails
+warnings.filterwarnings("ignore")
+
+from fake_market import use_offline_stack
+import main
+import buyer
+
+async def redeem(client, tx_hash, path):
+    # Retries while the payment is PENDING; returns the first settled status
+    for _ in range(100):
+        status, headers, body = await signal(client, tx_hash, path)
+        if status != 202: return status
+        await asyncio.sleep(0.2)
+    return 202
+
+async def signal(client, tx_hash, path):
+    async with client.http().get(client.api_url + path, headers={"Authorization": tx_hash}) as resp:
+        return resp.status, resp.headers, await resp.read()
+
+async def check_outage_refund(client, market, path="/signal?ticker=ETH-USD"):
+    key = Account.create().key
+    async with client.http().get(client.api_url + path) as resp: headers = resp.headers
+    tx_hash = await client.pay(key, headers["x-402-address"], int(headers["x-402-price"]), headers["x-402-token"])
+
+    during = await redeem(client, tx_hash, path) # Market down since startup: no candles cached anywhere
+    market.down = False
+    after = await redeem(client, tx_hash, path)
+    replay = await redeem(client, tx_hash, path)
+    ok = (during, after, replay) == (503, 200, 409)
+    return ok, f"paid during a data outage -> {during}, same hash after recovery -> {after}, replay -> {replay}"
+
+async def check_underpaid(client, path="/signal?ticker=ETH-USD"):
+    key = Account.create().key
+    async with client.http().get(client.api_url + path) as resp: headers = resp.headers
+    price = int(headers["x-402-price"])
+    tx_hash = await client.pay(key, headers["x-402-address"], price - 1, headers["x-402-token"])
+    status = await redeem(client, tx_hash, path)
+    return status == 403, f"paid {price - 1} of {price} -> {status}"
+
+async def check_malformed(client, path="/signal?ticker=ETH-USD"):
+    pending = main.payments.stats()["pending"]
+    statuses = [(await signal(client, "not-a-hash", path))[0] for _ in range(4)]
+    grew = main.payments.stats()["pending"] - pending
+    return statuses == [403] * 4 and grew == 0, f"Authorization: not-a-hash x4 -> {statuses}, pending lookups +{grew}"
+
+async def paid_signal(client, path):
+    async with client.http().get(client.api_url + path) as resp: headers = resp.headers
+    tx_hash = await client.pay(Account.create().key, headers["x-402-address"], int(headers["x-402-price"]), headers["x-402-token"])
+    for _ in range(100):
+        status, _, body = await signal(client, tx_hash, path)
+        if status != 202: return status, json.loads(body)
+        await asyncio.sleep(0.2)
+    return 202, None
+
+async def check_deadline_trade(client, ticker="BTC-USD"):
+    # LLM slower than the budget: the fallback isn't memoized, so the next buyer recomputes the key
+    main.llm_brain.model.latency = 0.6
+    path = f"/signal?ticker={ticker}&risk=0.9&budget=0.2"
+    store = main.predictor.portfolio.store
+    before = store.totals()["open_trades"]
+    try:
+        s1, first = await paid_signal(client, path)
+        await asyncio.sleep(1.0) # The late LLM answer lands in the decision cache meanwhile
+        s2, second = await paid_signal(client, path)
+    finally: main.llm_brain.model.latency = 0.0
+    opened = store.totals()["open_trades"] - before
+    sources = [r["data"]["details"]["Source"] if r else None for r in (first, second)]
+    ok = (s1, s2) == (200, 200) and sources[0] == "ENSEMBLE_DEADLINE" and opened <= 1
+    return ok, f"deadline fallback then recompute ({' -> '.join(map(str, sources))}) -> {opened} position(s) opened"
+
+async def check_budget(client):
+    # Out-of-range deadlines are refused before the 402, so nobody pays for them
+    statuses = {}
+    for budget in ["1e9", "-1", "0", "nan", "inf", str(main.SIGNAL_BUDGET)]:
+        async with client.http().get(f"{client.api_url}/signal?budget={budget}") as resp: statuses[budget] = resp.status
+    ok = all(code == 400 for b, code in statuses.items() if b != str(main.SIGNAL_BUDGET)) and statuses[str(main.SIGNAL_BUDGET)] == 402
+    return ok, "budget " + ", ".join(f"{b} -> {code}" for b, code in statuses.items())
+
+async def drive(port, market):
+    client = buyer.AgentClient(api_url=f"http://127.0.0.1:{port}", rpc_url=main.payments.rpc.rpc_url)
+    try: return [await check_outage_refund(client, market), await check_underpaid(client), await check_malformed(client), await check_deadline_trade(client), await check_budget(client)]
+    finally: await client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline checks of the paid /signal path")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--verbose", action="store_true", help="Keep the server's per-request prints")
+    args = parser.parse_args()
+
+    rpc, market, news = use_offline_stack(tempfile.mkdtemp(prefix="check_payments_"), rpc_latency=0.01, block_time=0.5, watch_poll=0.25)
+    market.down = True # Before startup, so the price feed can't warm the candle cache either
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=args.port, log_level="warning"))
+    threading.Thread(target=server.run, name="check-server", daemon=True).start()
+    while not server.started: time.sleep(0.05)
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with quiet: results = asyncio.run(drive(args.port, market))
+    server.should_exit = True
+
+    for ok, line in results: print(f"   {'✅' if ok else '❌'} {line}")
+    sys.exit(0 if all(ok for ok, _ in results) else 1)
@@ -0,0 +1,165 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import aiohttp
+from eth_account import Account
+
+# Multi-worker check: `uvicorn --workers N` against ONE state directory, fully offline.
+# The parent runs the fake chain + RSS feed; every worker installs the fake market and
+# the stub LLM (offline_app below) and shares logs, portfolio, signal cache and the
+# spent-payment index through the SQLite files in STATE_DIR.
+# Usage:
+#   python check_workers.py --workers 4 --buyers 40    # exits 1 if any check fails
+
+def offline_app():
+    # uvicorn --factory entry point, called once inside each worker process
+    from fake_market import FakeMarket
+    FakeMarket(latency=float(os.environ.get("FAKE_DATA_LATENCY", "0.1"))).install()
+    import brain
+    brain.news_feed.url = os.environ["FAKE_NEWS_URL"]
+    import main
+    main.payments.watcher.poll = 0.5
+    return main.app
+
+def fresh_session():
+    # New connection per request, so the kernel hands requests to different workers
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(force_close=True), timeout=aiohttp.ClientTimeout(total=30))
+
+async def get_json(http, url):
+    async with http.get(url) as resp: return await resp.json()
+
+async def worker_stats(http, api, workers, attempts=400):
+    """/cache_stats of every worker (each reports its own caches + pid)."""
+    seen = {}
+    for _ in range(attempts):
+        stats = await get_json(http, f"{api}/cache_stats")
+        seen[stats["worker"]] = stats
+        if len(seen) == workers: break
+    return seen
+
+async def check_logs(http, api, n):
+    await asyncio.gather(*[http.post(f"{api}/log", json={"source": "check", "action": "LOG", "message": f"entry-{i}"}) for i in range(n)])
+    # Entries posted to other workers reach this one's mirror within LOG_POLL
+    for _ in range(20):
+        entries = [e for e in await get_json(http, f"{api}/logs?limit=1000") if e["source"] == "check"]
+        if len(entries) >= n: break
+        await asyncio.sleep(0.1)
+    ids = [e["id"] for e in entries]
+    ok = len(entries) == n and len(set(ids)) == n and {e["message"] for e in entries} == {f"entry-{i}" for i in range(n)}
+    return ok, f"{len(entries)}/{n} entries posted to random workers visible from one, {len(set(ids))} unique ids"
+
+async def buy(client, http, key, ticker):
+    url = f"{client.api_url}/signal" + (f"?ticker={ticker}" if ticker else "") # None -> the server's default asset
+    async with http.get(url) as resp:
+        headers = resp.headers
+    tx_hash = await client.pay(key, headers["x-402-address"], int(headers["x-402-price"]), headers["x-402-token"])
+    for _ in range(120):
+        async with http.get(url, headers={"Authorization": tx_hash}) as resp:
+            if resp.status != 202: return resp.status, await resp.json(), tx_hash
+        await asyncio.sleep(0.25)
+    return 202, None, tx_hash
+
+async def check_replay(client, http, key, ticker, racers):
+    # One payment, many concurrent redemptions on different workers: exactly one may win
+    async with http.get(f"{client.api_url}/signal?ticker={ticker}") as resp: headers = resp.headers
+    tx_hash = await client.pay(key, headers["x-402-address"], int(headers["x-402-price"]), headers["x-402-token"])
+
+    async def redeem():
+        for _ in range(120):
+            async with http.get(f"{client.api_url}/signal?ticker={ticker}", headers={"Authorization": tx_hash}) as resp:
+                if resp.status != 202: return resp.status
+            await asyncio.sleep(0.1)
+        return 202
+    statuses = await asyncio.gather(*[redeem() for _ in range(racers)])
+    ok = statuses.count(200) == 1 and statuses.count(409) == racers - 1
+    return ok, f"{racers} concurrent redemptions of one payment -> {statuses.count(200)} x 200, {statuses.count(409)} x 409"
+
+async def check_defaults(client, http, api, keys, ticker="SOL-USD", buyers=8):
+    # /set_asset lands on one worker; unnamed requests served by any worker must follow it
+    async with http.post(f"{api}/set_asset", json={"ticker": ticker}) as resp: await resp.read()
+    outcomes = await asyncio.gather(*[buy(client, http, keys[i % len(keys)], None) for i in range(buyers)])
+    assets = [body["data"]["details"]["Asset"] for status, body, _ in outcomes if status == 200]
+    ok = assets == [ticker] * buyers
+    return ok, f"/set_asset {ticker} on one worker -> {assets.count(ticker)}/{buyers} unnamed requests on random workers served {ticker}"
+
+def check_portfolio(state_dir):
+    from portfolio_store import PortfolioStore
+    store = PortfolioStore(os.path.join(state_dir, "portfolio.db"))
+    totals = store.totals()
+    realized = store.connect().execute("SELECT COALESCE(SUM(profit), 0) FROM history").fetchone()[0]
+    ok = abs(totals["balance"] + totals["cost_basis"] - 10000.0 - realized) < 1e-6
+    return ok, f"cash {totals['balance']:.2f} + cost basis {totals['cost_basis']:.2f} = 10000 + realized {realized:.2f} ({totals['open_trades']} open)"
+
+async def drive(args, api, rpc_url):
+    client = buyer_client(api, rpc_url)
+    keys = [Account.create().key for _ in range(args.wallets)]
+    results = []
+    async with fresh_session() as http:
+        start = time.perf_counter()
+        outcomes = await asyncio.gather(*[buy(client, http, keys[i % len(keys)], args.tickers[i % len(args.tickers)]) for i in range(args.buyers)])
+        elapsed = time.perf_counter() - start
+        served = [o for o in outcomes if o[0] == 200]
+        results.append((len(served) == args.buyers, f"{len(served)}/{args.buyers} buyers served in {elapsed:.2f}s"))
+
+        # Same ticker + bar -> every buyer got the one shared computation
+        by_ticker = {}
+        for _, body, _ in served: by_ticker.setdefault(body["data"]["details"]["Asset"], []).append(body["data"])
+        same = all(all(d == group[0] for d in group) for group in by_ticker.values())
+        results.append((same, f"identical signal per ticker across workers ({len(by_ticker)} tickers)"))
+
+        stats = await worker_stats(http, api, args.workers)
+        computed = sum(s["signal"]["misses"] - s["signal"]["shared_hits"] - s["signal"]["remote_waits"] for s in stats.values())
+        results.append((computed == len(by_ticker), f"{computed} pipeline runs for {len(by_ticker)} (ticker, bar) keys across {len(stats)}/{args.workers} workers"))
+
+        results.append(await check_replay(client, http, keys[0], args.tickers[0], args.racers))
+        results.append(await check_logs(http, api, args.logs))
+        results.append(await check_defaults(client, http, api, keys))
+    await client.close()
+    return results
+
+def buyer_client(api, rpc_url):
+    import buyer
+    return buyer.AgentClient(api_url=api, rpc_url=rpc_url)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run several uvicorn workers against one shared state directory")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--buyers", type=int, default=40)
+    parser.add_argument("--wallets", type=int, default=10)
+    parser.add_argument("--tickers", nargs="+", default=["BTC-USD", "ETH-USD"])
+    parser.add_argument("--racers", type=int, default=16, help="Concurrent redemptions of one payment")
+    parser.add_argument("--logs", type=int, default=100)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--verbose", action="store_true", help="Show the workers' output")
+    args = parser.parse_args()
+
+    from fake_rpc import FakeRPC
+    from fake_market import FakeNews
+    rpc = FakeRPC(latency=0.02, block_time=1.0).start()
+    news = FakeNews().start()
+    state_dir = tempfile.mkdtemp(prefix="check_workers_")
+    env = dict(os.environ, STATE_DIR=state_dir, RPC_URL=rpc.url, FAKE_NEWS_URL=news.url, LLM_BACKEND="stub")
+    out = None if args.verbose else subprocess.DEVNULL
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "check_workers:offline_app", "--factory",
+                               "--workers", str(args.workers), "--port", str(args.port), "--log-level", "warning"],
+                              env=env, stdout=out, stderr=out)
+    api = f"http://127.0.0.1:{args.port}"
+    try:
+        async def wait_ready():
+            async with fresh_session() as http:
+                for _ in range(300):
+                    try: return len(await worker_stats(http, api, args.workers, attempts=50))
+                    except aiohttp.ClientError: await asyncio.sleep(0.2)
+        print(f"🧩 {asyncio.run(wait_ready())}/{args.workers} workers up, state in {state_dir}")
+        results = asyncio.run(drive(args, api, rpc.url))
+        results.append(check_portfolio(state_dir))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    for ok, line in results: print(f"   {'✅' if ok else '❌'} {line}")
+    sys.exit(0 if all(ok for ok, _ in results) else 1)
@@ -0,0 +1,152 @@
+import time
+import threading
+import numpy as np
+import pandas as pd
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# --- FAKE MARKET (Offline stand-ins for yfinance and the CoinDesk RSS feed) ---
+# Usage:
+#   market = FakeMarket(latency=0.2).install()   # model.yf.download now answers from here
+#   news = FakeNews(latency=0.1).start()
+#   news_feed.url = news.url
+
+START_PRICES = {"BTC-USD": 65000.0, "ETH-USD": 3200.0, "SOL-USD": 150.0, "DOGE-USD": 0.15}
+
+class FakeMarket:
+    """Deterministic synthetic candles served through the yf.download signature."""
+    def __init__(self, latency=0.0, vol=0.004, seed=7):
+        self.latency = latency
+        self.vol = vol
+        self.seed = seed
+        self.down = False # True = answer like yfinance during an outage (empty frame)
+        self.calls = 0
+        self.original = None
+
+    def install(self, module=None):
+        import yfinance
+        module = module or yfinance
+        self.module, self.original = module, module.download
+        module.download = self.download
+        return self
+
+    def uninstall(self):
+        if self.original is not None: self.module.download = self.original
+
+    def noise(self, n, salt):
+        # Stateless hash noise in [-1, 1): the same bar always gets the same value
+        return 2 * np.modf(np.abs(np.sin(n * 12.9898 + salt * 78.233 + self.seed)) * 43758.5453)[0] - 1
+
+    def candles(self, ticker, start, end, interval):
+        freq = interval[:-1] + "min" if interval.endswith("m") else interval
+        step = pd.Timedelta(freq)
+        # Prices are a closed-form function of the bar number, so overlapping
+        # downloads (full history, then deltas) agree on every bar they share
+        index = pd.date_range(start.floor(freq), end.floor(freq), freq=freq)
+        n = (index.values.astype("datetime64[ns]").astype(np.int64) // step.value).astype(np.float64)
+        salt = sum(map(ord, ticker))
+        log_price = (np.log(START_PRICES.get(ticker, 100.0))
+                     + 0.04 * np.sin(n / 300 + salt) + 0.015 * np.sin(n / 23 + salt)
+                     + self.vol * (self.noise(n, salt) + self.noise(n, salt + 1)))
+        close = np.exp(log_price)
+        prev = np.exp(log_price - self.vol * self.noise(n, salt + 2))
+        spread = self.vol * np.abs(self.noise(n, salt + 3)) / 2
+        return pd.DataFrame({
+            "Open": prev, "High": np.maximum(prev, close) * (1 + spread), "Low": np.minimum(prev, close) * (1 - spread),
+            "Close": close, "Adj Close": close, "Volume": 1_000 + 50_000 * np.abs(self.noise(n, salt + 4))
+        }, index=index)
+
+    def download(self, tickers, period=None, start=None, end=None, interval="1d", group_by="column", progress=True, **kwargs):
+        self.calls += 1
+        if self.latency: time.sleep(self.latency)
+        if self.down: return pd.DataFrame()
+        end = pd.Timestamp.now(tz="UTC") if end is None else pd.Timestamp(end)
+        if start is not None:
+            start = pd.Timestamp(start)
+            if start.tzinfo is None: start = start.tz_localize("UTC")
+        else:
+            start = end - pd.Timedelta(period or "7d")
+        names = [tickers] if isinstance(tickers, str) else list(tickers)
+        frames = {t: self.candles(t, start, end, interval) for t in names}
+        if isinstance(tickers, str) or len(names) == 1:
+            df = frames[names[0]]
+            # yfinance >= 0.2.48 returns (field, ticker) columns even for one ticker
+            df.columns = pd.MultiIndex.from_product([df.columns, names])
+            return df
+        return pd.concat(frames, axis=1) if group_by == "ticker" else pd.concat(frames, axis=1).swaplevel(0, 1, axis=1)
+
+HEADLINES = [
+    "Bitcoin holds above key support as ETF inflows continue",
+    "Ether rallies after network upgrade lands on mainnet",
+    "Solana DEX volume hits record as memecoin mania returns",
+    "Dogecoin jumps on renewed social media buzz",
+    "Crypto markets steady ahead of Fed rate decision",
+    "BTC miners sell reserves as hashprice slides",
+]
+
+class FakeNews:
+    """Local RSS 2.0 endpoint with injected latency; rotates one fresh headline per poll."""
+    def __init__(self, latency=0.0, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.requests = 0
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.url = f"http://{host}:{self.server.server_address[1]}/rss"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-news", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def feed(self):
+        now = time.time()
+        titles = [f"Market wrap #{self.requests}: {HEADLINES[self.requests % len(HEADLINES)]}"] + HEADLINES
+        items = "".join(
+            f"<item><title>{title}</title><guid>{i}-{title}</guid>"
+            f"<pubDate>{formatdate(now - i * 300)}</pubDate><description>{title}</description></item>"
+            for i, title in enumerate(titles)
+        )
+        return f'<?xml version="1.0"?><rss version="2.0"><channel><title>Fake Wire</title>{items}</channel></rss>'.encode()
+
+    def handler(self):
+        news = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                news.requests += 1
+                if news.latency: time.sleep(news.latency)
+                data = news.feed()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/rss+xml")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args): pass
+        return Handler
+
+# --- OFFLINE STACK (the real app on every stand-in, state in a scratch directory) ---
+def use_offline_stack(workdir, rpc_latency=0.0, block_time=0.0, data_latency=0.0, news_latency=0.0, llm_latency=0.0, watch_poll=None):
+    """Points main's app at a fake chain, market, RSS feed and stub LLM, and swaps every state
+    store main.py opens for a fresh one in workdir. Returns (rpc, market, news)."""
+    import os
+    import brain
+    import main
+    import model
+    from fake_rpc import FakeRPC
+    from payments import PaymentVerifier
+    rpc = FakeRPC(latency=rpc_latency, block_time=block_time).start()
+    market = FakeMarket(latency=data_latency).install()
+    news = FakeNews(latency=news_latency).start()
+    brain.news_feed.url = news.url
+    main.llm_brain.model, main.llm_brain.connected = brain.StubBackend(latency=llm_latency), True
+
+    state = lambda name: os.path.join(workdir, name)
+    model.STATE_DIR = workdir # Anything opened later (prices.db at startup, ...) lands here too
+    main.predictor.portfolio = model.PortfolioManager(state("portfolio.db"), state("none.json"))
+    main.predictor.defaults = model.AgentDefaults(state("portfolio.db"))
+    main.predictor.signal_cache = model.SharedSignalCache(state("signals.db"))
+    main.payments = PaymentVerifier(rpc.url, main.SELLER_ADDRESS, main.USDC_CONTRACT, min_amount=main.PRICE_UNITS, spent_path=state("payments.db"))
+    if watch_poll is not None: main.payments.watcher.poll = watch_poll
+    main.agent_logs = main.SharedLogStore(state("logs.db"))
+    return rpc, market, news
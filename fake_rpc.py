@@ -0,0 +1,128 @@
+import json
+import time
+import threading
+import rlp
+from eth_account import Account
+from eth_utils import keccak
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# --- FAKE RPC NODE (Offline stand-in for Base Sepolia) ---
+# Answers single and batched JSON-RPC requests for the calls the server makes.
+# Usage:
+#   rpc = FakeRPC(latency=0.05).start()
+#   rpc.add_transfer("0xabc...", to=SELLER_ADDRESS)
+#   PaymentVerifier(rpc.url, SELLER_ADDRESS, USDC_CONTRACT)
+# Signed transfers sent with eth_sendRawTransaction land in the next block;
+# block_time > 0 mines one in the background every block_time seconds.
+
+USDC_CONTRACT = "0x036CbD53842c5426634e7929541eC2318f3dCF7e"
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+class FakeRPC:
+    def __init__(self, latency=0.0, host="127.0.0.1", port=0, block_time=0.0, gas_price=1_000_000):
+        self.latency = latency
+        self.block_time = block_time
+        self.gas_price = gas_price
+        self.txs = {}
+        self.nonces = {}    # sender -> nonces already sent
+        self.requests = 0   # HTTP round trips
+        self.calls = 0      # JSON-RPC calls (a batch counts each entry)
+        self.block = 1000
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-rpc", daemon=True).start()
+        if self.block_time: threading.Thread(target=self.produce_blocks, name="fake-rpc-miner", daemon=True).start()
+        return self
+
+    def produce_blocks(self):
+        while True:
+            time.sleep(self.block_time)
+            self.mine()
+
+    def stop(self):
+        self.server.shutdown()
+
+    def add_transfer(self, tx_hash, to, amount=1_000_000, token=USDC_CONTRACT, status=1, mined=True):
+        """Registers a USDC transfer(to, amount) tx. mined=False keeps it pending until mine()."""
+        data = "0xa9059cbb" + to.lower().replace("0x", "").rjust(64, "0") + hex(amount)[2:].rjust(64, "0")
+        with self.lock:
+            self.txs[tx_hash.lower()] = {"to": token, "input": data, "status": status, "block": self.block if mined else None}
+
+    def mine(self, tx_hash=None):
+        with self.lock:
+            self.block += 1
+            for h, tx in self.txs.items():
+                if tx["block"] is None and (tx_hash is None or h == tx_hash.lower()): tx["block"] = self.block
+
+    def send_raw(self, raw):
+        # Legacy tx RLP: [nonce, gasPrice, gas, to, value, data, v, r, s]
+        raw = bytes.fromhex(raw[2:] if raw.startswith("0x") else raw)
+        sender = Account.recover_transaction(raw).lower()
+        nonce, _, _, to, _, data = rlp.decode(raw)[:6]
+        nonce = int.from_bytes(nonce, "big")
+        tx_hash = "0x" + keccak(raw).hex()
+        with self.lock:
+            # Like a node's tx pool: reused nonces are rejected, out-of-order ones are queued
+            used = self.nonces.setdefault(sender, set())
+            if nonce in used: raise ValueError("nonce too low")
+            used.add(nonce)
+            self.txs[tx_hash] = {"to": "0x" + to.hex(), "input": "0x" + data.hex(), "status": 1, "block": None}
+        return tx_hash
+
+    def answer(self, request):
+        method, params = request.get("method"), request.get("params", [])
+        self.calls += 1
+        if method == "eth_sendRawTransaction": return self.send_raw(params[0])
+        with self.lock:
+            if method == "eth_blockNumber": return hex(self.block)
+            if method == "eth_gasPrice": return hex(self.gas_price)
+            if method == "eth_getTransactionCount": return hex(max(self.nonces.get(str(params[0]).lower(), {-1})) + 1)
+            if method in ("eth_getTransactionReceipt", "eth_getTransactionByHash"):
+                tx = self.txs.get(str(params[0]).lower())
+                if tx is None: return None
+                if method == "eth_getTransactionByHash":
+                    return {"hash": params[0], "to": tx["to"], "input": tx["input"], "blockNumber": hex(tx["block"]) if tx["block"] else None}
+                if tx["block"] is None: return None
+                return {"transactionHash": params[0], "status": hex(tx["status"]), "blockNumber": hex(tx["block"])}
+            if method == "eth_getLogs": return self.logs(params[0])
+        raise ValueError(f"unsupported method {method}")
+
+    def logs(self, query):
+        # USDC Transfer logs of successful mined txs, filtered like a real node (topic[2] = recipient)
+        start, end = int(query["fromBlock"], 16), int(query["toBlock"], 16)
+        topics = query.get("topics", [])
+        out = []
+        for h, tx in self.txs.items():
+            if tx["block"] is None or tx["status"] != 1 or not (start <= tx["block"] <= end): continue
+            if str(query.get("address", tx["to"])).lower() != tx["to"].lower(): continue
+            recipient = "0x" + tx["input"][10:74]
+            if len(topics) > 2 and topics[2] and topics[2].lower() != recipient: continue
+            out.append({
+                "transactionHash": h, "blockNumber": hex(tx["block"]), "address": tx["to"],
+                "topics": [TRANSFER_TOPIC, "0x" + "0" * 64, recipient], "data": "0x" + tx["input"][74:]
+            })
+        return out
+
+    def handler(self):
+        rpc = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                rpc.requests += 1
+                if rpc.latency: time.sleep(rpc.latency)
+                def reply(req):
+                    try: return {"jsonrpc": "2.0", "id": req.get("id"), "result": rpc.answer(req)}
+                    except Exception as e: return {"jsonrpc": "2.0", "id": req.get("id"), "error": {"code": -32601, "message": str(e)}}
+                out = [reply(r) for r in body] if isinstance(body, list) else reply(body)
+                data = json.dumps(out).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args): pass
+        return Handler
@@ -0,0 +1,111 @@
+import os
+import glob
+import shutil
+import numpy as np
+import joblib
+from metrics import timed
+
+# --- COMPACT FOREST (RandomForest trees as flat NumPy arrays) ---
+# One .npy per array inside model_{ticker}.forest/ so np.load(mmap_mode="r")
+# lets every uvicorn worker share the same read-only pages.
+ARRAYS = ["feature", "threshold", "children", "value", "roots", "depth", "classes"]
+
+def compact_path(ticker):
+    return f"model_{ticker}.forest"
+
+def compile_forest(model):
+    """Packs a fitted RandomForestClassifier into concatenated node arrays.
+
+    Leaves point to themselves (children = [self, self]), which is also how the
+    traversal kernel recognises them.
+    """
+    feature, threshold, children, value, roots = [], [], [], [], []
+    offset, depth = 0, 0
+    for est in model.estimators_:
+        tree = est.tree_
+        is_leaf = tree.children_left == -1
+        own = np.arange(tree.node_count) + offset
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+        threshold.append(tree.threshold.astype(np.float64))
+        children.append(np.stack([
+            np.where(is_leaf, own, tree.children_left + offset),
+            np.where(is_leaf, own, tree.children_right + offset)
+        ], axis=1).astype(np.int32))
+        # Same normalization sklearn applies per tree inside predict_proba
+        proba = tree.value[:, 0, :].astype(np.float64)
+        normalizer = proba.sum(axis=1)[:, None]
+        normalizer[normalizer == 0.0] = 1.0
+        value.append(proba / normalizer)
+        offset += tree.node_count
+        depth = max(depth, tree.max_depth)
+
+    return {
+        "feature": np.concatenate(feature),
+        "threshold": np.concatenate(threshold),
+        "children": np.ascontiguousarray(np.concatenate(children)),
+        "value": np.ascontiguousarray(np.concatenate(value)),
+        "roots": np.array(roots, dtype=np.int32),
+        "depth": np.array(depth, dtype=np.int32),
+        "classes": np.asarray(model.classes_),
+    }
+
+def export_compact(model, path):
+    # Build the new arrays beside the old directory, then swap directories: a reader maps
+    # either the complete old forest or the complete new one, never a mix of both.
+    # Already-mapped old arrays stay valid after the old directory is removed.
+    tmp, old = f"{path}.tmp-{os.getpid()}", f"{path}.old-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, arr in compile_forest(model).items():
+        np.save(os.path.join(tmp, f"{name}.npy"), arr)
+    if os.path.isdir(path): os.rename(path, old)
+    os.rename(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+    return path
+
+class CompactForest:
+    """Drop-in for RandomForestClassifier.predict_proba backed by (memory-mapped) flat arrays."""
+    def __init__(self, arrays):
+        for name in ARRAYS: setattr(self, name, arrays[name])
+        self.classes_ = self.classes
+        self.n_estimators = len(self.roots)
+        self.max_depth = int(self.depth)
+        self.children_flat = self.children.reshape(-1)
+        self.is_leaf = self.children[:, 0] == np.arange(len(self.children))
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        return cls({name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAYS})
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(compile_forest(model))
+
+    @timed("predict_proba")
+    def predict_proba(self, X):
+        # sklearn evaluates forests on float32 features; match it so thresholds split identically
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1: X = X[None, :]
+        n_rows, n_trees = len(X), self.n_estimators
+        flat_x = X.ravel().astype(np.float64)
+        # One cursor per (row, tree); only cursors not yet at a leaf are advanced each step
+        node = np.tile(np.asarray(self.roots, dtype=np.int64), n_rows)
+        row_base = np.repeat(np.arange(n_rows) * X.shape[1], n_trees)
+        active = np.arange(node.size)
+        while active.size:
+            cur = node[active]
+            go_right = flat_x[row_base[active] + self.feature[cur]] > self.threshold[cur]
+            cur = self.children_flat[2 * cur + go_right]
+            node[active] = cur
+            active = active[~self.is_leaf[cur]]
+        # cumsum adds trees strictly in order, like sklearn's accumulator -> bit-identical sums
+        leaf_proba = self.value[node].reshape(n_rows, n_trees, -1)
+        return np.cumsum(leaf_proba, axis=1)[:, -1] / n_trees
+
+if __name__ == "__main__":
+    # Export every trained fleet model next to its pickle
+    for pkl in sorted(glob.glob("model_*.pkl")):
+        ticker = pkl[len("model_"):-len(".pkl")]
+        path = export_compact(joblib.load(pkl), compact_path(ticker))
+        print(f"💾 Compact Saved: {path}")
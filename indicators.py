@@ -0,0 +1,119 @@
+import math
+from collections import deque
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# --- FEATURE ENGINE (Same math as the original pandas rolling() chain) ---
+FEATURE_COLS = ['Log_Ret', 'Vol', 'RSI', 'Momentum']
+INDICATOR_COLS = ['Log_Ret', 'Vol', 'RSI', 'SMA_50', 'Momentum']
+VOL_WINDOW = 20
+RSI_WINDOW = 14
+SMA_WINDOW = 50
+RESYNC_EVERY = 500 # Recompute running sums from the windows to stop float drift
+
+def compute_batch(close):
+    """Batch mode: every indicator column in one NumPy pass. Warmup rows are NaN."""
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    n = len(close)
+    out = {col: np.full(n, np.nan) for col in INDICATOR_COLS}
+    if n < 2: return out
+
+    log_ret = out['Log_Ret']
+    log_ret[1:] = np.log(close[1:] / close[:-1])
+
+    # pandas' delta.where(delta > 0, 0) turns the leading NaN into 0, so the RSI window includes it
+    delta = np.diff(close, prepend=np.nan)
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+
+    if n > VOL_WINDOW:
+        out['Vol'][VOL_WINDOW:] = sliding_window_view(log_ret[1:], VOL_WINDOW).std(axis=1, ddof=1)
+    if n >= RSI_WINDOW:
+        avg_gain = sliding_window_view(gain, RSI_WINDOW).mean(axis=1)
+        avg_loss = sliding_window_view(loss, RSI_WINDOW).mean(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out['RSI'][RSI_WINDOW - 1:] = 100 - (100 / (1 + avg_gain / avg_loss))
+    if n >= SMA_WINDOW:
+        out['SMA_50'][SMA_WINDOW - 1:] = sliding_window_view(close, SMA_WINDOW).mean(axis=1)
+    out['Momentum'] = (close - out['SMA_50']) / out['SMA_50']
+    return out
+
+class IndicatorStream:
+    """Streaming mode: O(1) rolling state updated once per candle for live inference."""
+    def __init__(self):
+        self.prev_close = None
+        self.closes = deque(maxlen=SMA_WINDOW)
+        self.rets = deque(maxlen=VOL_WINDOW)
+        self.gains = deque(maxlen=RSI_WINDOW)
+        self.losses = deque(maxlen=RSI_WINDOW)
+        self.close_sum = 0.0
+        self.ret_sum = 0.0
+        self.ret_sq = 0.0
+        self.gain_sum = 0.0
+        self.loss_sum = 0.0
+        self.updates = 0
+
+    @classmethod
+    def seed(cls, closes):
+        # State only depends on the last SMA_WINDOW + 1 closes
+        stream = cls()
+        for c in list(closes)[-(SMA_WINDOW + 1):]: stream.update(c)
+        return stream
+
+    def copy(self):
+        clone = IndicatorStream.__new__(IndicatorStream)
+        clone.__dict__.update(self.__dict__)
+        for name in ('closes', 'rets', 'gains', 'losses'):
+            setattr(clone, name, deque(getattr(self, name), maxlen=getattr(self, name).maxlen))
+        return clone
+
+    def push(self, window, value, total):
+        if len(window) == window.maxlen: total -= window[0]
+        window.append(value)
+        return total + value
+
+    def update(self, close):
+        """Commits a closed candle and returns its feature values."""
+        close = float(close)
+        if self.prev_close is None:
+            log_ret, gain, loss = math.nan, 0.0, 0.0
+        else:
+            log_ret = math.log(close / self.prev_close)
+            delta = close - self.prev_close
+            gain, loss = max(delta, 0.0), max(-delta, 0.0)
+            if len(self.rets) == VOL_WINDOW: self.ret_sq -= self.rets[0] ** 2
+            self.ret_sum = self.push(self.rets, log_ret, self.ret_sum)
+            self.ret_sq += log_ret ** 2
+        self.gain_sum = self.push(self.gains, gain, self.gain_sum)
+        self.loss_sum = self.push(self.losses, loss, self.loss_sum)
+        self.close_sum = self.push(self.closes, close, self.close_sum)
+        self.prev_close = close
+
+        self.updates += 1
+        if self.updates % RESYNC_EVERY == 0: self.resync()
+        return self.values(close, log_ret)
+
+    def peek(self, close):
+        """Feature values for a still-forming candle, without committing it."""
+        return self.copy().update(close)
+
+    def resync(self):
+        self.close_sum = math.fsum(self.closes)
+        self.ret_sum = math.fsum(self.rets)
+        self.ret_sq = math.fsum(r * r for r in self.rets)
+        self.gain_sum = math.fsum(self.gains)
+        self.loss_sum = math.fsum(self.losses)
+
+    def values(self, close, log_ret):
+        vol = rsi = sma = momentum = math.nan
+        if len(self.rets) == VOL_WINDOW:
+            var = (self.ret_sq - self.ret_sum * self.ret_sum / VOL_WINDOW) / (VOL_WINDOW - 1)
+            vol = math.sqrt(max(var, 0.0))
+        if len(self.gains) == RSI_WINDOW:
+            avg_gain, avg_loss = self.gain_sum / RSI_WINDOW, self.loss_sum / RSI_WINDOW
+            if avg_loss > 0: rsi = 100 - (100 / (1 + avg_gain / avg_loss))
+            elif avg_gain > 0: rsi = 100.0
+        if len(self.closes) == SMA_WINDOW:
+            sma = self.close_sum / SMA_WINDOW
+            momentum = (close - sma) / sma
+        return {'Log_Ret': log_ret, 'Vol': vol, 'RSI': rsi, 'SMA_50': sma, 'Momentum': momentum}
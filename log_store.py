@@ -0,0 +1,161 @@
+import json
+import asyncio
+import threading
+from collections import deque
+from state_db import state_db
+
+# --- LOG STORE (fixed-size ring buffer) ---
+# Appends are O(1) and the oldest entries fall off once capacity is reached.
+# Every entry gets a monotonically increasing id, so clients ask only for what
+# they haven't seen (since=<id>) or follow the push stream.
+LOG_CAPACITY = 1000
+LOG_PAGE = 50          # Entries served by a plain /logs call
+STREAM_KEEPALIVE = 15.0 # Seconds between SSE comments so proxies keep the stream open
+LOG_POLL = 0.25        # Seconds between a worker's checks for entries other workers appended
+
+class LogStore:
+    def __init__(self, capacity=LOG_CAPACITY):
+        self.capacity = capacity
+        self.entries = deque(maxlen=capacity)
+        self.seq = 0
+        self.epoch = 0 # Bumped by clear() so streams tell their clients to reset
+        self.lock = threading.Lock()
+        self.loop = None
+        self.changed = None
+
+    def bind(self, loop):
+        # Streams wait on an asyncio.Event that belongs to the server loop
+        self.loop = loop
+        self.changed = asyncio.Event()
+
+    def notify(self):
+        if self.loop is None: return
+        try: running = asyncio.get_running_loop()
+        except RuntimeError: running = None
+        if running is self.loop: self.wake()
+        else: self.loop.call_soon_threadsafe(self.wake) # append() from a worker thread
+
+    def wake(self):
+        # Swap in a fresh event: everyone waiting on the old one wakes exactly once
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def append(self, entry):
+        with self.lock:
+            self.seq += 1
+            entry = dict(entry, id=self.seq)
+            self.entries.append(entry)
+        self.notify()
+        return entry
+
+    def since(self, last_id=0, limit=LOG_PAGE):
+        """Entries newer than last_id, newest first (the order /logs has always used)."""
+        with self.lock:
+            out = []
+            for entry in reversed(self.entries):
+                if entry["id"] <= last_id or len(out) >= limit: break
+                out.append(entry)
+        return out
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.epoch += 1
+        self.notify()
+
+    async def stream(self, last_id=0):
+        """Server-Sent Events: backlog after last_id, then each new entry as it is appended."""
+        epoch = self.epoch
+        while True:
+            changed = self.changed
+            if self.epoch != epoch:
+                epoch = self.epoch
+                yield "event: clear\ndata: {}\n\n"
+            # Oldest first on the wire so ids arrive in order
+            for entry in reversed(self.since(last_id, limit=self.capacity)):
+                last_id = entry["id"]
+                yield f"id: {entry['id']}\ndata: {json.dumps(entry)}\n\n"
+            try: await asyncio.wait_for(changed.wait(), STREAM_KEEPALIVE)
+            except asyncio.TimeoutError: yield ": keepalive\n\n"
+
+
+# --- SHARED LOG STORE (one SQLite file for every uvicorn worker) ---
+LOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (id INTEGER PRIMARY KEY AUTOINCREMENT, entry TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS log_meta (id INTEGER PRIMARY KEY CHECK (id = 1), epoch INTEGER NOT NULL);
+INSERT OR IGNORE INTO log_meta (id, epoch) VALUES (1, 0);
+"""
+
+class SharedLogStore(LogStore):
+    """LogStore with the ring buffer in SQLite, so logs posted to any worker reach every dashboard.
+
+    The in-memory ring is a mirror of logs.db that one follower task per worker keeps in
+    sync (from a thread, every LOG_POLL seconds or right after a local write) and then
+    wakes the worker's streams, so since() and stream() never touch SQLite. append() and
+    clear() do: call them off the event loop. AUTOINCREMENT ids stay unique and ordered
+    across processes (and survive clear()), so since=<id> and Last-Event-ID keep working.
+    """
+    def __init__(self, path="logs.db", capacity=LOG_CAPACITY):
+        super().__init__(capacity)
+        self.path = path
+        self.wanted = None
+        self.follower = None
+        self.connect().executescript(LOG_SCHEMA)
+        self.sync()
+
+    def connect(self):
+        return state_db(self.path)
+
+    def bind(self, loop):
+        super().bind(loop)
+        self.wanted = asyncio.Event()
+        self.follower = loop.create_task(self.follow())
+
+    def sync(self):
+        """Copies rows (and clears) made by any worker into the mirror. True if it changed."""
+        db = self.connect()
+        epoch = db.execute("SELECT epoch FROM log_meta WHERE id = 1").fetchone()[0]
+        with self.lock:
+            cleared = epoch != self.epoch
+            last_id = 0 if cleared or not self.entries else self.entries[-1]["id"]
+        rows = db.execute("SELECT id, entry FROM logs WHERE id > ? ORDER BY id DESC LIMIT ?", (last_id, self.capacity)).fetchall()
+        with self.lock:
+            if cleared:
+                self.entries.clear()
+                self.epoch = epoch
+            self.entries.extend(dict(json.loads(entry), id=entry_id) for entry_id, entry in reversed(rows))
+        return cleared or bool(rows)
+
+    async def follow(self):
+        # The worker's only reader of logs.db, however many dashboards are streaming
+        while True:
+            try: await asyncio.wait_for(self.wanted.wait(), LOG_POLL)
+            except asyncio.TimeoutError: pass
+            self.wanted.clear()
+            try:
+                if await asyncio.to_thread(self.sync): self.wake()
+            except Exception as e: print(f"⚠️ Log sync failed: {e}")
+
+    def notify(self):
+        # Local writes only ask the follower to sync now; it wakes the streams
+        if self.loop is not None: self.loop.call_soon_threadsafe(self.wanted.set)
+
+    def append(self, entry):
+        db = self.connect()
+        entry_id = db.execute("INSERT INTO logs (entry) VALUES (?)", (json.dumps(entry),)).lastrowid
+        # Keep it a ring: rows older than the last `capacity` fall off
+        db.execute("DELETE FROM logs WHERE id <= ?", (entry_id - self.capacity,))
+        self.notify()
+        return dict(entry, id=entry_id)
+
+    def clear(self):
+        db = self.connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM logs")
+            db.execute("UPDATE log_meta SET epoch = epoch + 1 WHERE id = 1")
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        self.notify()
@@ -0,0 +1,165 @@
+import os
+import glob
+import pickle
+import zipfile
+import threading
+import collections
+import numpy as np
+from indicators import FEATURE_COLS, INDICATOR_COLS
+from metrics import timed
+
+# --- LSTM SCORER (shipped lstm_*.pth checkpoints, NumPy inference on CPU) ---
+# The checkpoints are plain state_dicts of nn.LSTM(batch_first) + nn.Linear(hidden, 1).
+# They are read straight from the .pth zip, so serving needs no torch install.
+# Per ticker the recurrent state (h, c) after the last CLOSED candle is cached: a new candle
+# costs one step, the forming candle is one more step that is never stored. All fleet
+# tickers advance together as one batch.
+LSTM_CHECKPOINT = "lstm_v3.pth"
+SEED_BARS = 96  # Closed candles replayed to build a ticker's state from scratch (one day of 15m bars)
+
+# Input width -> columns, in the order the checkpoints were trained on
+INPUTS = {1: ["Close"], len(FEATURE_COLS): FEATURE_COLS, len(INDICATOR_COLS): INDICATOR_COLS}
+DTYPES = {"FloatStorage": np.float32, "DoubleStorage": np.float64, "HalfStorage": np.float16,
+          "LongStorage": np.int64, "IntStorage": np.int32}
+
+def load_state_dict(path):
+    """{name: ndarray} from a torch zip checkpoint. Only tensor containers are unpickled."""
+    with zipfile.ZipFile(path) as archive:
+        pkl = next(n for n in archive.namelist() if n.endswith("/data.pkl"))
+        prefix = pkl[:-len("data.pkl")]
+
+        def storage(pid):
+            _, storage_type, key, _, numel = pid
+            return np.frombuffer(archive.read(f"{prefix}data/{key}"), dtype=DTYPES[storage_type], count=numel)
+
+        def rebuild_tensor(flat, offset, size, stride, *_):
+            if not size: return flat[offset].copy()
+            strides = [s * flat.itemsize for s in stride]
+            return np.lib.stride_tricks.as_strided(flat[offset:], shape=size, strides=strides).copy()
+
+        class Unpickler(pickle.Unpickler):
+            def find_class(self, module, name):
+                if (module, name) == ("collections", "OrderedDict"): return collections.OrderedDict
+                if (module, name) == ("torch._utils", "_rebuild_tensor_v2"): return rebuild_tensor
+                if module == "torch" and name in DTYPES: return name
+                raise pickle.UnpicklingError(f"Refusing to load {module}.{name} from {path}")
+            def persistent_load(self, pid): return storage(pid)
+
+        return dict(Unpickler(archive.open(pkl)).load())
+
+def sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+class LSTMScorer:
+    """P(up) per ticker from a stacked LSTM, with cached recurrent state per ticker."""
+    def __init__(self, state_dict, name="lstm"):
+        self.name = name
+        self.layers = []
+        while f"lstm.weight_ih_l{len(self.layers)}" in state_dict:
+            k = len(self.layers)
+            # Pre-transposed so a step is x @ W (B x in) @ (in x 4H); both biases folded into one
+            self.layers.append((
+                np.ascontiguousarray(state_dict[f"lstm.weight_ih_l{k}"].T, dtype=np.float32),
+                np.ascontiguousarray(state_dict[f"lstm.weight_hh_l{k}"].T, dtype=np.float32),
+                (state_dict[f"lstm.bias_ih_l{k}"] + state_dict[f"lstm.bias_hh_l{k}"]).astype(np.float32),
+            ))
+        self.hidden = self.layers[0][1].shape[0]
+        self.fc_w = state_dict["fc.weight"].T.astype(np.float32)
+        self.fc_b = state_dict["fc.bias"].astype(np.float32)
+        self.columns = INPUTS[self.layers[0][0].shape[0]]
+        # A Close-only checkpoint regresses the next (scaled) close; the others emit a logit
+        self.regression = self.columns == ["Close"]
+        self.states = {}  # ticker -> {"h", "c", "time", "mean", "std"}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        return cls(load_state_dict(path), name=os.path.basename(path))
+
+    def step(self, x, h, c):
+        # One timestep for a batch: x (B, in), h / c (layers, B, H) -> new h, c
+        h_out, c_out = np.empty_like(h), np.empty_like(c)
+        H = self.hidden
+        for k, (w_ih, w_hh, bias) in enumerate(self.layers):
+            gates = x @ w_ih + h[k] @ w_hh + bias
+            i, f = sigmoid(gates[:, :H]), sigmoid(gates[:, H:2 * H])
+            g, o = np.tanh(gates[:, 2 * H:3 * H]), sigmoid(gates[:, 3 * H:])
+            c_out[k] = f * c[k] + i * g
+            h_out[k] = x = o * np.tanh(c_out[k])
+        return h_out, c_out
+
+    def head(self, h, x_last):
+        out = (h[-1] @ self.fc_w + self.fc_b)[:, 0]
+        return sigmoid(out - x_last[:, 0]) if self.regression else sigmoid(out)
+
+    def seed(self, values):
+        # No scaler was shipped with the checkpoints: inputs are standardized with the
+        # statistics of the history the state is built from, then frozen for that ticker
+        mean, std = values.mean(axis=0), values.std(axis=0)
+        std[std == 0] = 1.0
+        return {"mean": mean, "std": std}
+
+    def advance(self, states, rows):
+        """Steps every ticker's stored state through its new closed rows, batched by timestep."""
+        longest = max(len(r) for r in rows)
+        for t in range(longest):
+            active = [k for k, r in enumerate(rows) if len(r) > t]
+            x = np.stack([(rows[k][t] - states[k]["mean"]) / states[k]["std"] for k in active]).astype(np.float32)
+            h = np.stack([states[k]["h"] for k in active], axis=1)
+            c = np.stack([states[k]["c"] for k in active], axis=1)
+            h, c = self.step(x, h, c)
+            for j, k in enumerate(active):
+                states[k]["h"], states[k]["c"] = h[:, j], c[:, j]
+
+    def tail(self, df):
+        # Only the last SEED_BARS closed candles + the forming one can matter
+        df = df.iloc[-(SEED_BARS + 1):]
+        return df.index.values, df.to_numpy(dtype=np.float64)[:, [list(df.columns).index(col) for col in self.columns]]
+
+    @timed("lstm_predict")
+    def predict_many(self, frames):
+        """{ticker: features frame} -> {ticker: P(up)}. Last row = forming candle, never stored."""
+        if not frames: return {}
+        tickers = list(frames)
+        with self.lock:
+            states, rows, forming = [], [], []
+            for t in tickers:
+                times, values = self.tail(frames[t])
+                forming.append(values[-1])
+                state = self.states.get(t)
+                known = np.flatnonzero(times[:-1] == state["time"]) if state else []
+                if len(known):
+                    new = values[known[0] + 1:-1]  # Usually 0 or 1 candles since the last call
+                else:
+                    # First sight of this ticker (or a gap in its history): rebuild from recent bars
+                    history = values[:-1][-SEED_BARS:]
+                    state = self.seed(history if len(history) else values)
+                    state["h"] = state["c"] = np.zeros((len(self.layers), self.hidden), dtype=np.float32)
+                    new = history
+                state = dict(state, time=times[-2] if len(times) > 1 else state.get("time"))
+                states.append(state)
+                rows.append(new)
+            if any(len(r) for r in rows): self.advance(states, rows)
+            for t, state in zip(tickers, states): self.states[t] = state
+
+        # The forming candle: one batched step from the cached states, result discarded
+        x = np.stack([(row - s["mean"]) / s["std"] for row, s in zip(forming, states)]).astype(np.float32)
+        h, c = self.step(x, np.stack([s["h"] for s in states], axis=1), np.stack([s["c"] for s in states], axis=1))
+        return dict(zip(tickers, self.head(h, x).tolist()))
+
+    def stats(self):
+        return {"checkpoint": self.name, "layers": len(self.layers), "hidden": self.hidden,
+                "inputs": self.columns, "tickers": len(self.states)}
+
+def load_scorer(path=LSTM_CHECKPOINT):
+    # Optional ensemble member: no checkpoint (or an unreadable one) just means forest-only
+    if not path or not os.path.exists(path): return None
+    try: return LSTMScorer.load(path)
+    except Exception as e:
+        print(f"⚠️ LSTM checkpoint unreadable ({e}), serving without it")
+        return None
+
+if __name__ == "__main__":
+    # Describe every shipped checkpoint
+    for path in sorted(glob.glob("lstm*.pth")):
+        print(f"🧬 {path}: {LSTMScorer.load(path).stats()}")
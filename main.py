@@ -1,23 +1,35 @@
-from fastapi import FastAPI, Header, HTTPException, Response
+import os
+import hmac
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from web3 import Web3
+import asyncio
 import datetime
-import subprocess
-import sys
 
 # Import our Hybrid Agent
-from model import predictor 
+from model import predictor, price_feed, run_stage, state_path, MODEL_POOL, STATE_POOL, SIGNAL_BUDGET
+from brain import news_feed, llm_brain
+from payments import PaymentVerifier, VERIFIED, PENDING, SPENT
+from log_store import SharedLogStore, LOG_PAGE
+from buyer import AgentClient, AgentRunner
+from metrics import registry, span
+from train_fleet import RetrainScheduler
 
 app = FastAPI()
 
 # --- CONFIGURATION ---
-RPC_URL = "https://sepolia.base.org" 
+RPC_URL = os.environ.get("RPC_URL", "https://sepolia.base.org")
 SELLER_ADDRESS = "0xb2984A80Bcb06Dbe7c1f9849949B8c02A71fbE48" 
 USDC_CONTRACT = "0x036CbD53842c5426634e7929541eC2318f3dCF7e" 
 PRICE_USDC = 1.0 
+PRICE_UNITS = int(PRICE_USDC * 1_000_000) # USDC has 6 decimals; transfers below this are refused
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN") # /admin/* answers 403 until this is set
+RETRAIN_HOURS = float(os.environ.get("RETRAIN_HOURS", "0")) # 0 = no scheduled retraining
 
-w3 = Web3(Web3.HTTPProvider(RPC_URL))
+# Async + batched: receipt lookups from all buyers share JSON-RPC batches, results are cached
+# and every hash that bought a signal is recorded so it can't be replayed
+payments = PaymentVerifier(RPC_URL, SELLER_ADDRESS, USDC_CONTRACT, min_amount=PRICE_UNITS, spent_path=state_path("payments.db"))
 
 app.add_middleware(
     CORSMiddleware, allow_origins=["*"], allow_credentials=True,
@@ -25,24 +37,56 @@ app.add_middleware(
     expose_headers=["x-402-price", "x-402-address", "x-402-token"]
 )
 
-agent_logs = []
+@app.middleware("http")
+async def signal_metrics(request: Request, call_next):
+    # Only the paid endpoint is tracked, so label cardinality stays fixed
+    if request.url.path != "/signal": return await call_next(request)
+    with span("http_signal"):
+        response = await call_next(request)
+    registry.count("signal_responses_total", status=response.status_code)
+    return response
+
+@app.on_event("startup")
+async def start_background_feeds():
+    # Mark-to-market prices for every fleet ticker, refreshed in the background
+    price_feed.start(predictor.processor, list(predictor.models), path=state_path("prices.db"))
+    # Headlines are polled here so /signal never waits on the RSS feed
+    news_feed.start()
+    # One block follower confirms every buyer's payment from USDC Transfer logs
+    payments.watcher.start()
+    agent_logs.bind(asyncio.get_running_loop())
+    # New model files from train_fleet.py are validated and swapped in without a restart
+    predictor.models.watch()
+    retrainer.start()
+
+# Ring buffer with sequence ids, shared by all workers: dashboards fetch deltas (since=) or follow /logs/stream
+agent_logs = SharedLogStore(state_path("logs.db"))
 
 class LogEntry(BaseModel):
     source: str; action: str; message: str; timestamp: str = None
 
+async def record_log(entry):
+    # SQLite write on a state thread: another worker holding the lock never stalls this loop
+    entry = dict(entry, timestamp=datetime.datetime.now().strftime("%H:%M:%S"))
+    return await run_stage(STATE_POOL, agent_logs.append, entry)
+
 @app.post("/log")
 async def add_log(entry: LogEntry):
-    entry.timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-    agent_logs.insert(0, entry) 
-    return {"status": "Logged"}
+    stored = await record_log(dict(entry))
+    return {"status": "Logged", "id": stored["id"]}
 
 @app.get("/logs")
-async def get_logs(): return agent_logs[:50] 
+async def get_logs(since: int = 0, limit: int = LOG_PAGE): return agent_logs.since(since, limit) # This worker's mirror, no SQLite
+
+@app.get("/logs/stream")
+async def stream_logs(since: int = 0, last_event_id: int = Header(None)):
+    # EventSource resends Last-Event-ID on reconnect, so nothing is missed or repeated
+    last_id = last_event_id if last_event_id is not None else since
+    return StreamingResponse(agent_logs.stream(last_id), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @app.get("/clear_logs")
 async def clear_logs():
-    global agent_logs
-    agent_logs = []
+    await run_stage(STATE_POOL, agent_logs.clear)
     return {"status": "Cleared"}
 
 # --- ASSET & RISK MANAGEMENT ---
@@ -51,58 +95,118 @@ class RiskRequest(BaseModel): level: float
 
 @app.post("/set_asset")
 async def set_asset(req: AssetRequest):
-    success = predictor.set_asset(req.ticker)
+    success = await run_stage(STATE_POOL, predictor.set_asset, req.ticker)
     return {"status": "success", "asset": req.ticker} if success else {"status": "error"}
 
 @app.post("/set_risk")
 async def set_risk(req: RiskRequest):
-    success = predictor.set_risk(req.level)
+    success = await run_stage(STATE_POOL, predictor.set_risk, req.level)
     return {"status": "success", "risk": req.level} if success else {"status": "error"}
 
+# --- MODEL REGISTRY ---
+retrainer = RetrainScheduler(RETRAIN_HOURS, lock_path=state_path("retrain.lock"))
+
+@app.get("/models")
+async def list_models():
+    sequence = predictor.sequence.stats() if predictor.sequence else None
+    return {"models": predictor.models.stats(), "sequence": sequence, "retrain": {"hours": RETRAIN_HOURS, "last_run": retrainer.last_run, "last_status": retrainer.last_status}}
+
+@app.post("/admin/reload_models")
+async def reload_models(ticker: str = None, x_admin_token: str = Header(None)):
+    # Closed unless ADMIN_TOKEN is configured
+    if not ADMIN_TOKEN or not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN): raise HTTPException(status_code=403, detail="Forbidden")
+    if ticker is not None and ticker not in predictor.models.tickers: raise HTTPException(status_code=400, detail=f"Unknown asset: {ticker}")
+    if ticker is None:
+        # Loading happens off the event loop; serving continues on the current models meanwhile
+        swapped = await run_stage(MODEL_POOL, predictor.models.check_updates)
+        return {"status": "ok", "swapped": swapped, "models": predictor.models.stats()}
+    try: version = await run_stage(MODEL_POOL, predictor.models.reload, ticker)
+    except Exception as e: raise HTTPException(status_code=422, detail=f"Model rejected: {e}")
+    return {"status": "ok", "swapped": {ticker: version}, "models": predictor.models.stats()}
+
 # --- AGENT TRIGGER ---
+# Agents run as tasks on this loop over one pooled client; their logs go straight into the store
+agent_runner = AgentRunner(AgentClient(rpc_url=RPC_URL, log_sink=record_log))
+
 @app.post("/trigger_agent")
 async def trigger_agent():
     print("🚀 USER COMMAND: Executing Autonomous Agent...")
-    subprocess.Popen([sys.executable, "buyer.py"])
-    return {"status": "started", "message": "Agent process spawned"}
+    agent_runner.submit()
+    return {"status": "started", "message": "Agent scheduled", "running": len(agent_runner.tasks)}
 
 # --- PAYMENT VERIFICATION ---
-def verify_payment(tx_hash: str):
-    print(f"\n🕵️ VERIFYING TX: {tx_hash}")
-    try:
-        try: receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=30)
-        except: return False
-        if receipt['status'] != 1: return False
-
-        tx = w3.eth.get_transaction(tx_hash)
-        input_data = tx['input']
-        if hasattr(input_data, 'hex'): input_data = input_data.hex()
-        input_data = str(input_data).lower()
-        if not input_data.startswith("0x"): input_data = "0x" + input_data
-
-        if tx['to'].lower() != USDC_CONTRACT.lower(): return False
-        if not input_data.startswith("0xa9059cbb"): return False
-        
-        params = input_data[10:]
-        if ("0x" + params[24:64]).lower() != SELLER_ADDRESS.lower(): return False
-
-        print("✅ PAYMENT VERIFIED!")
-        return True
-    except: return False
+async def verify_payment(tx_hash: str):
+    # Never blocks on the chain: PENDING until the watcher sees the Transfer
+    status = await payments.check(tx_hash)
+    if status == VERIFIED: print(f"\n✅ PAYMENT VERIFIED! {tx_hash}")
+    return status
 
 @app.get("/signal")
-async def get_signal(authorization: str = Header(None)):
+async def get_signal(authorization: str = Header(None), fleet: bool = False, ticker: str = None, risk: float = None, budget: float = SIGNAL_BUDGET):
+    # Per-request settings (?ticker=&risk=); /set_asset and /set_risk only set the defaults.
+    # Checked before the 402 so nobody pays for a request that can't be served
+    try: ticker, risk = predictor.settings(ticker, risk)
+    except ValueError as e: raise HTTPException(status_code=400, detail=str(e))
+    # A caller may ask for a tighter deadline, never a longer one (that would re-open the unbounded LLM wait)
+    if not 0 < budget <= SIGNAL_BUDGET: raise HTTPException(status_code=400, detail=f"budget must be within (0, {SIGNAL_BUDGET}] seconds")
+
     if not authorization:
-        headers = { "x-402-price": str(int(PRICE_USDC * 1_000_000)), "x-402-address": SELLER_ADDRESS, "x-402-token": USDC_CONTRACT }
+        headers = { "x-402-price": str(PRICE_UNITS), "x-402-address": SELLER_ADDRESS, "x-402-token": USDC_CONTRACT }
         return Response(status_code=402, headers=headers)
 
-    if verify_payment(authorization):
-        prediction = predictor.predict_next_move()
-        print(f"✅ DELIVERED: {prediction['signal']} ({prediction['confidence']}%)")
+    status = await verify_payment(authorization)
+    if status == PENDING:
+        # Client retries the same hash; it confirms as soon as its block is scanned
+        return Response(status_code=202, content='{"status": "PENDING"}', media_type="application/json", headers={"Retry-After": "2"})
+    if status == SPENT or (status == VERIFIED and not await run_stage(STATE_POOL, payments.claim, authorization)):
+        raise HTTPException(status_code=409, detail="Payment already used")
+
+    if status == VERIFIED:
+        try:
+            if fleet:
+                # One payment -> signals for the whole model fleet
+                prediction = await predictor.scan_fleet_async(risk, budget=budget)
+            else:
+                prediction = await predictor.predict_next_move_async(ticker, risk, budget=budget)
+        except asyncio.CancelledError:
+            # Client gone / server stopping before a 200: the payment stays redeemable. Not awaited,
+            # a cancelled handler may not get to resume
+            STATE_POOL.submit(payments.release, authorization)
+            raise
+        except Exception as e:
+            print(f"❌ Signal failed: {e}")
+            prediction = {"signal": "ERROR", "confidence": 0}
+        if prediction.get("signal") == "ERROR":
+            # Nothing delivered -> the payment stays redeemable; the buyer retries with the same hash
+            await run_stage(STATE_POOL, payments.release, authorization)
+            raise HTTPException(status_code=503, detail="Signal unavailable, retry with the same payment", headers={"Retry-After": "5"})
+        if fleet: print(f"✅ DELIVERED: FLEET SCAN ({len(prediction.get('assets', {}))} assets)")
+        else: print(f"✅ DELIVERED: {ticker} {prediction['signal']} ({prediction['confidence']}%)")
         return {"status": "PAID", "data": prediction}
     else:
         raise HTTPException(status_code=403, detail="Invalid Transaction")
 
+def cache_snapshot():
+    return {"signal": predictor.signal_cache.stats(), "llm": llm_brain.cache.stats(), "payments": payments.stats()}
+
+@app.get("/cache_stats")
+async def cache_stats(): return dict(cache_snapshot(), worker=os.getpid()) # Caches above the shared stores are per worker
+
+# --- METRICS (Prometheus scrape target) ---
+def cache_gauge(field):
+    return lambda: {name: stats[field] for name, stats in cache_snapshot().items() if field in stats}
+
+registry.collect("cache_hit_ratio", "Hit rate per cache", "cache", cache_gauge("hit_rate"))
+registry.collect("cache_entries", "Entries held per cache", "cache", cache_gauge("entries"))
+registry.collect("cache_inflight", "Single-flight computations / pending payments", "cache", lambda: {
+    "signal": predictor.signal_cache.stats()["inflight"], "payments": payments.stats()["pending"]
+})
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # WORKERS=N -> N processes sharing logs, portfolio, asset/risk defaults, signal cache and spent index through STATE_DIR
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=int(os.environ.get("WORKERS", "1")))
\ No newline at end of file
@@ -0,0 +1,121 @@
+import time
+import bisect
+import asyncio
+import functools
+import threading
+from contextlib import contextmanager
+
+# --- METRICS (Prometheus text exposition, no extra dependency) ---
+# A span is two perf_counter() calls plus two short per-stage lock holds
+# (~2µs per call), so it stays on in production.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Last slot = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.inflight = 0
+        self.lock = threading.Lock()
+
+    def enter(self):
+        with self.lock: self.inflight += 1
+
+    def observe(self, seconds, leaving=False):
+        slot = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            self.counts[slot] += 1
+            self.sum += seconds
+            self.count += 1
+            if leaving: self.inflight -= 1
+
+    def snapshot(self):
+        with self.lock: return list(self.counts), self.sum, self.count, self.inflight
+
+class Registry:
+    def __init__(self):
+        self.stages = {}     # stage -> Histogram
+        self.counters = {}   # (name, labels) -> int
+        self.collectors = [] # (name, help, label, fn) read at scrape time
+        self.lock = threading.Lock()
+
+    def stage(self, name):
+        hist = self.stages.get(name)
+        if hist is None:
+            with self.lock: hist = self.stages.setdefault(name, Histogram())
+        return hist
+
+    @contextmanager
+    def span(self, name):
+        hist = self.stage(name)
+        hist.enter()
+        start = time.perf_counter()
+        try: yield
+        finally: hist.observe(time.perf_counter() - start, leaving=True)
+
+    def timed(self, name):
+        """Decorator form of span() for plain and async functions (inlined: no generator per call)."""
+        hist = self.stage(name)
+        def wrap(fn):
+            if asyncio.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def timed_async(*args, **kwargs):
+                    hist.enter()
+                    start = time.perf_counter()
+                    try: return await fn(*args, **kwargs)
+                    finally: hist.observe(time.perf_counter() - start, leaving=True)
+                return timed_async
+            @functools.wraps(fn)
+            def timed_sync(*args, **kwargs):
+                hist.enter()
+                start = time.perf_counter()
+                try: return fn(*args, **kwargs)
+                finally: hist.observe(time.perf_counter() - start, leaving=True)
+            return timed_sync
+        return wrap
+
+    def count(self, name, n=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock: self.counters[key] = self.counters.get(key, 0) + n
+
+    def collect(self, name, help, label, fn):
+        # fn() -> {label value: number}, e.g. cache hit rates pulled from the caches' own stats()
+        self.collectors.append((name, help, label, fn))
+
+    def render(self):
+        lines = [
+            "# HELP stage_seconds Wall time per pipeline stage",
+            "# TYPE stage_seconds histogram",
+        ]
+        inflight = []
+        for name, hist in sorted(self.stages.items()):
+            counts, total, count, running = hist.snapshot()
+            cumulative = 0
+            for le, n in zip([*map(str, hist.buckets), "+Inf"], counts):
+                cumulative += n
+                lines.append(f'stage_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'stage_seconds_sum{{stage="{name}"}} {total:.6f}')
+            lines.append(f'stage_seconds_count{{stage="{name}"}} {count}')
+            inflight.append(f'stage_inflight{{stage="{name}"}} {running}')
+        lines += ["# HELP stage_inflight Calls currently inside each stage", "# TYPE stage_inflight gauge", *inflight]
+
+        with self.lock: counters = sorted(self.counters.items())
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        for name, help, label, fn in self.collectors:
+            try: values = fn()
+            except Exception: continue
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+            lines += [f'{name}{{{label}="{key}"}} {value}' for key, value in values.items()]
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+span = registry.span
+timed = registry.timed
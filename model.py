@@ -4,166 +4,687 @@ import pandas as pd
 import numpy as np
 import joblib 
 import json
-from datetime import datetime
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 from sklearn.preprocessing import StandardScaler
 from brain import llm_brain 
+from indicators import FEATURE_COLS, INDICATOR_COLS, compute_batch, IndicatorStream
+from forest import CompactForest, compact_path, export_compact
+from lstm import load_scorer, LSTM_CHECKPOINT
+from portfolio_store import PortfolioStore, TAKE_PROFIT, STOP_LOSS
+from metrics import timed
+from state_db import state_db
+
+# --- 0. EXECUTION POOLS (Keep the event loop free) ---
+# Each blocking stage gets its own bounded pool so a slow Gemini call can't starve yfinance
+DATA_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="data")
+MODEL_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="model") # One per fleet model
+LLM_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="llm")
+PORTFOLIO_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="portfolio") # 1 writer = no lost updates
+STATE_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="state") # Shared SQLite files: lock waits never block the loop
+
+SIGNAL_BUDGET = 4.0 # Seconds a paid /signal may wait for the LLM before the ensemble answers
+STATE_DIR = os.environ.get("STATE_DIR", ".") # SQLite files shared by every uvicorn worker on the box
+
+def state_path(name):
+    return os.path.join(STATE_DIR, name)
+
+async def run_stage(pool, fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, fn, *args)
+
+async def within_deadline(task, deadline):
+    # Returns None if the deadline passes first. The task keeps running, so a late LLM
+    # answer still lands in the decision cache for the next caller.
+    remaining = deadline - asyncio.get_running_loop().time()
+    try: return await asyncio.wait_for(asyncio.shield(task), timeout=max(remaining, 0))
+    except asyncio.TimeoutError:
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return None
 
 # --- 1. DATA PROCESSOR (The Eyes) ---
+CANDLE_TTL = 3600   # Drop a (ticker, interval) entry nobody asked for in an hour
+
+def bar_floor(interval="15m"):
+    # Start of the candle currently forming, e.g. 12:07 -> 12:00 for 15m bars
+    freq = interval[:-1] + "min" if interval.endswith("m") else interval
+    return pd.Timestamp.now(tz="UTC").floor(freq)
+
+class CandleCache:
+    """Shared per-(ticker, interval) candles + indicators, refreshed by delta once per bar."""
+    def __init__(self, ttl=CANDLE_TTL):
+        self.ttl = ttl
+        self.entries = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def key_lock(self, key):
+        with self.lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def evict(self):
+        now = time.time()
+        with self.lock:
+            for key in [k for k, e in self.entries.items() if now - e["used_at"] > self.ttl]:
+                del self.entries[key]
+
+    def get(self, processor, ticker, interval="15m", period="7d"):
+        return self.get_many(processor, [ticker], interval=interval, period=period).get(ticker)
+
+    def get_many(self, processor, tickers, interval="15m", period="7d"):
+        # All stale tickers are refreshed with ONE batched download
+        self.evict()
+        locks = [self.key_lock(key) for key in sorted((t, interval) for t in tickers)]
+        for lock in locks: lock.acquire() # Sorted order -> no deadlock between overlapping scans
+        try:
+            bar = bar_floor(interval)
+            result, stale = {}, []
+            for t in tickers:
+                entry = self.entries.get((t, interval))
+                if entry and entry["bar"] == bar:
+                    entry["used_at"] = time.time()
+                    result[t] = entry
+                else: stale.append(t)
+            if not stale: return result
+
+            cached = [self.entries.get((t, interval)) for t in stale]
+            if any(entry is None for entry in cached):
+                fetched = processor.fetch_fleet_data(stale, period=period, interval=interval)
+            else:
+                # Only pull the bars since our last (then still forming) candle
+                fetched = processor.fetch_fleet_data(stale, interval=interval, start=min(e["raw"].index[-1] for e in cached))
+
+            for t, entry in zip(stale, cached):
+                entry = self.refresh(processor, entry, fetched.get(t), bar, period)
+                if entry is None: continue
+                with self.lock: self.entries[(t, interval)] = entry # evict() walks entries under self.lock
+                price_feed.update(t, entry["raw"]['Close'].iloc[-1])
+                result[t] = entry
+            return result
+        finally:
+            for lock in locks: lock.release()
+
+    def refresh(self, processor, entry, fetched, bar, period):
+        if fetched is None: return entry # Keep serving the old bar; next request retries
+        if entry is None:
+            raw = fetched
+            features = processor.add_indicators(raw.copy())
+            # Stream holds every closed bar; the last (forming) one is only ever peeked
+            stream = IndicatorStream.seed(raw['Close'].values[:-1])
+        else:
+            last = entry["raw"].index[-1]
+            delta = fetched[fetched.index >= last]
+            if delta.empty: return entry
+            raw = pd.concat([entry["raw"], delta])
+            raw = raw[~raw.index.duplicated(keep="last")]
+            raw = raw[raw.index >= raw.index[-1] - pd.Timedelta(period)]
+            stream = entry["stream"]
+            features = processor.extend_indicators(entry["features"], raw, last, stream)
+        return {"raw": raw, "features": features, "stream": stream, "bar": bar, "used_at": time.time()}
+
+PRICE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (ticker TEXT PRIMARY KEY, price REAL NOT NULL, fetched_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS price_lease (id INTEGER PRIMARY KEY CHECK (id = 1), leased_at REAL NOT NULL);
+INSERT OR IGNORE INTO price_lease (id, leased_at) VALUES (1, 0);
+"""
+
+class PriceFeed:
+    """Latest close per ticker: filled in by the candle cache whenever it refreshes and, every
+    `every` seconds, by ONE worker re-fetching the forming bar into prices.db for all of them."""
+    def __init__(self):
+        self.prices = {} # ticker -> (price, fetched_at)
+        self.path = None # Set by start(); until then prices are this process's own
+        self.thread = None
+
+    def update(self, ticker, price, fetched_at=None):
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        current = self.prices.get(ticker)
+        if current is None or fetched_at >= current[1]: self.prices[ticker] = (float(price), fetched_at)
+
+    def snapshot(self):
+        return {t: price for t, (price, fetched_at) in self.prices.items()}
+
+    def connect(self):
+        return state_db(self.path)
+
+    def lease(self, every):
+        # Whoever ticks first in each period downloads; the other workers only read the table
+        now = time.time()
+        return self.connect().execute(
+            "UPDATE price_lease SET leased_at = ? WHERE id = 1 AND leased_at <= ?", (now, now - 0.9 * every)
+        ).rowcount == 1
+
+    def refresh(self, processor, tickers, interval="15m", every=60):
+        # The cache only downloads once per bar; the forming bar's close moves in between.
+        # Its fresh candle is only used for prices, the cached features stay per bar.
+        entries = candle_cache.get_many(processor, tickers, interval=interval)
+        if entries and (self.path is None or self.lease(every)):
+            start = min(e["raw"].index[-1] for e in entries.values())
+            fetched, now = processor.fetch_fleet_data(list(entries), interval=interval, start=start), time.time()
+            for t, df in fetched.items(): self.update(t, df['Close'].iloc[-1], now)
+            if self.path is not None:
+                self.connect().executemany("INSERT OR REPLACE INTO prices (ticker, price, fetched_at) VALUES (?, ?, ?)",
+                                           [(t, float(df['Close'].iloc[-1]), now) for t, df in fetched.items()])
+        if self.path is not None:
+            for row in self.connect().execute("SELECT ticker, price, fetched_at FROM prices"): self.update(*row)
+
+    def start(self, processor, tickers, interval="15m", every=60, path=None):
+        # Keeps every fleet ticker fresh even if nobody requests it (one batched forming-bar fetch
+        # per `every` for the whole box when path is a shared prices.db)
+        if self.thread: return
+        self.path = path
+        if path is not None: self.connect().executescript(PRICE_SCHEMA)
+        def loop():
+            while True:
+                try: self.refresh(processor, tickers, interval=interval, every=every)
+                except Exception as e: print(f"⚠️ Price feed refresh failed: {e}")
+                time.sleep(every)
+        self.thread = threading.Thread(target=loop, name="price-feed", daemon=True)
+        self.thread.start()
+
+candle_cache = CandleCache()
+price_feed = PriceFeed()
+
 class DataProcessor:
     def __init__(self):
         self.scaler = StandardScaler()
         
-    def fetch_live_data(self, ticker="BTC-USD", period="7d", interval="15m"):
+    @timed("fetch_live_data")
+    def fetch_live_data(self, ticker="BTC-USD", period="7d", interval="15m", start=None):
         try:
-            df = yf.download(ticker, period=period, interval=interval, progress=False)
+            if start is not None: df = yf.download(ticker, start=start, interval=interval, progress=False)
+            else: df = yf.download(ticker, period=period, interval=interval, progress=False)
             if df.empty: return None
             if isinstance(df.columns, pd.MultiIndex):
                 df.columns = df.columns.get_level_values(0)
             return df
         except: return None
 
+    @timed("fetch_fleet_data")
+    def fetch_fleet_data(self, tickers, period="7d", interval="15m", start=None):
+        # One batched yfinance call for several tickers -> {ticker: frame}
+        if len(tickers) == 1:
+            df = self.fetch_live_data(ticker=tickers[0], period=period, interval=interval, start=start)
+            return {tickers[0]: df} if df is not None else {}
+        try:
+            window = {"start": start} if start is not None else {"period": period}
+            df = yf.download(tickers, interval=interval, group_by="ticker", progress=False, **window)
+            if df.empty: return {}
+            frames = {}
+            for t in tickers:
+                if t not in df.columns.get_level_values(0): continue
+                sub = df[t].dropna(how="all") # Batched frames share one index across tickers
+                if not sub.empty: frames[t] = sub
+            return frames
+        except: return {}
+
+    def get_live_features(self, ticker="BTC-USD", interval="15m"):
+        # Cached path for live inference: one small delta download per closed bar
+        entry = candle_cache.get(self, ticker, interval=interval)
+        if entry is None: return None
+        return entry["features"].copy()
+
+    def get_fleet_features(self, tickers, interval="15m"):
+        entries = candle_cache.get_many(self, tickers, interval=interval)
+        return {t: entry["features"].copy() for t, entry in entries.items()}
+
+    @timed("add_indicators")
     def add_indicators(self, df):
-        df['Log_Ret'] = np.log(df['Close'] / df['Close'].shift(1))
-        df['Vol'] = df['Log_Ret'].rolling(window=20).std()
-        delta = df['Close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        df['RSI'] = 100 - (100 / (1 + rs))
-        df['SMA_50'] = df['Close'].rolling(window=50).mean()
-        df['Momentum'] = (df['Close'] - df['SMA_50']) / df['SMA_50']
+        # Batch mode: one NumPy pass over the Close column (identical to the old rolling() chain)
+        for col, values in compute_batch(df['Close'].values).items():
+            df[col] = values
         df.dropna(inplace=True)
         return df
 
+    @timed("extend_indicators")
+    def extend_indicators(self, features, raw, changed_from, stream):
+        # Streaming mode: O(1) per new candle. Rows before changed_from are already in the stream.
+        new = raw[raw.index >= changed_from].copy()
+        rows = [stream.update(c) for c in new['Close'].values[:-1]]
+        rows.append(stream.peek(new['Close'].values[-1]))
+        for col in INDICATOR_COLS:
+            new[col] = [row[col] for row in rows]
+        new.dropna(inplace=True)
+        kept = features[(features.index < changed_from) & (features.index >= raw.index[0])]
+        return pd.concat([kept, new])
+
 # --- 2. PORTFOLIO MANAGER (The Wallet) ---
 class PortfolioManager:
-    def __init__(self, filename="portfolio.json"):
+    def __init__(self, filename="portfolio.db", legacy_json="portfolio.json"):
         self.filename = filename
-        self.data = self.load_data()
-    
-    def load_data(self):
-        if os.path.exists(self.filename):
-            try:
-                with open(self.filename, 'r') as f: return json.load(f)
-            except: pass
-        # Default State: $10,000 Cash, No Positions
-        return {"balance": 10000.0, "positions": [], "history": []}
-
-    def save_data(self):
-        with open(self.filename, 'w') as f: json.dump(self.data, f, indent=4)
-
-    def execute_buy(self, ticker, price):
-        # Position Size: $1,000 per trade
-        if self.data["balance"] >= 1000:
-            self.data["balance"] -= 1000
-            units = 1000 / price
-            self.data["positions"].append({
-                "ticker": ticker,
-                "entry_price": price,
-                "units": units,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            })
-            self.save_data()
-            return True
-        return False
+        # Default State: $10,000 Cash, No Positions (imported from portfolio.json on first run)
+        self.store = PortfolioStore(filename, starting_balance=10000.0)
+        self.store.migrate_json(legacy_json)
 
+    @timed("execute_buy")
+    def execute_buy(self, ticker, price, key=None):
+        # Position Size: $1,000 per trade; at most one per signal key
+        return self.store.open_position(ticker, price, 1000, key=key)
+
+    @timed("check_exit")
     def check_exit(self, ticker, current_price):
         # Rule: Sell if profit > 1.5% OR loss > 3% (Stop Loss)
         # Returns: Realized PnL (or 0 if no sale)
-        realized_pnl = 0
-        active_positions = []
-        
-        for pos in self.data["positions"]:
-            if pos["ticker"] == ticker:
-                # Calculate % change
-                pct_change = (current_price - pos["entry_price"]) / pos["entry_price"]
-                
-                # TAKE PROFIT (+1.5%) or STOP LOSS (-3%)
-                if pct_change >= 0.015 or pct_change <= -0.03:
-                    # Sell!
-                    revenue = pos["units"] * current_price
-                    profit = revenue - 1000
-                    self.data["balance"] += revenue
-                    self.data["history"].append({
-                        "ticker": ticker,
-                        "profit": profit,
-                        "exit_price": current_price,
-                        "time": datetime.now().strftime("%H:%M")
-                    })
-                    realized_pnl += profit
-                else:
-                    active_positions.append(pos) # Keep holding
-            else:
-                active_positions.append(pos)
-        
-        self.data["positions"] = active_positions
-        self.save_data()
-        return realized_pnl
-
-    def get_stats(self):
-        # Calculate Total Valuation (Cash + Open Positions)
-        # Note: We need current prices for perfect accuracy, but we'll approximate with entry for speed
-        equity = self.data["balance"]
-        for pos in self.data["positions"]:
-            equity += (pos["units"] * pos["entry_price"]) 
-            
+        to_close = []
+        # The book only hands back positions whose trigger prices were crossed
+        for pos in self.store.triggered(ticker, current_price):
+            # Calculate % change
+            pct_change = (current_price - pos["entry_price"]) / pos["entry_price"]
+            # TAKE PROFIT (+1.5%) or STOP LOSS (-3%)
+            if pct_change >= TAKE_PROFIT or pct_change <= STOP_LOSS:
+                to_close.append(pos["id"])
+
+        if not to_close: return 0 # Nothing to sell -> nothing to write
+        return self.store.close_positions(ticker, current_price, to_close)
+
+    def get_stats(self, prices=None):
+        # Calculate Total Valuation (Cash + Open Positions marked at the latest close)
+        # Prices come from the shared feed in memory -> no network call per request
+        prices = price_feed.snapshot() if prices is None else prices
+        totals = self.store.totals()
+        market_value = 0
+        for ticker, exposure in self.store.exposure().items():
+            price = prices.get(ticker)
+            # No price seen yet for this ticker -> fall back to cost basis
+            market_value += exposure["units"] * price if price else exposure["cost_basis"]
+
+        equity = totals["balance"] + market_value
         pnl_pct = ((equity - 10000) / 10000) * 100
         return {
-            "balance": round(self.data["balance"], 2),
+            "balance": round(totals["balance"], 2),
             "equity": round(equity, 2),
             "pnl_pct": round(pnl_pct, 2),
-            "open_trades": len(self.data["positions"])
+            "unrealized_pnl": round(market_value - totals["cost_basis"], 2),
+            "open_trades": totals["open_trades"]
+        }
+
+# --- 3. SIGNAL CACHE (One computation per closed bar) ---
+class SignalCache:
+    """Memoizes signals per (ticker, bar, risk) and coalesces concurrent misses (single-flight)."""
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.results = OrderedDict()
+        self.inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_compute(self, key, compute, keep=None):
+        if key in self.results:
+            self.hits += 1
+            self.results.move_to_end(key)
+            return self.results[key]
+        if key in self.inflight:
+            # Someone is already computing this exact signal -> wait for their answer
+            self.coalesced += 1
+            return await asyncio.shield(self.inflight[key])
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            result = await compute()
+        except BaseException as e:
+            # Cancelled owners too: waiters get an error instead of hanging on a future nobody resolves
+            if not isinstance(e, Exception): e = RuntimeError(f"Signal computation for {key} was cancelled")
+            future.set_exception(e)
+            future.exception() # Mark retrieved; waiters re-raise it themselves
+            raise
+        finally:
+            del self.inflight[key]
+
+        if keep is None or keep(result):
+            self.results[key] = result
+            if len(self.results) > self.max_entries: self.results.popitem(last=False)
+        future.set_result(result)
+        return result
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "entries": len(self.results),
+            "inflight": len(self.inflight)
         }
 
-# --- 3. THE HYBRID AGENT ---
+# Cross-worker layer: results + single-flight leases in SQLite
+SIGNAL_LEASE = SIGNAL_BUDGET + 10.0 # Seconds before a stalled owner's computation may be taken over
+SIGNAL_POLL = 0.05                  # Seconds between checks while another worker computes
+SIGNAL_TTL = 24 * 3600              # Rows older than this are pruned
+SIGNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signals (
+    key TEXT PRIMARY KEY,
+    result TEXT,                     -- JSON; NULL while the owning worker is computing
+    kept INTEGER NOT NULL DEFAULT 0, -- 0 = served once (deadline fallback), not reused
+    leased_at REAL NOT NULL
+)"""
+
+class SharedSignalCache(SignalCache):
+    """SignalCache shared by every uvicorn worker through one SQLite file.
+
+    The in-process layer still coalesces requests inside a worker; on a local miss the
+    worker either reads the stored result, claims the key (and computes it, paper trade
+    included, exactly once for the whole box) or waits for the worker that claimed it.
+    """
+    def __init__(self, path="signals.db", max_entries=256, lease=SIGNAL_LEASE):
+        super().__init__(max_entries)
+        self.path = path
+        self.lease = lease
+        self.shared_hits = 0
+        self.remote_waits = 0
+        self.connect().execute(SIGNAL_SCHEMA)
+
+    def connect(self):
+        return state_db(self.path)
+
+    async def get_or_compute(self, key, compute, keep=None):
+        return await super().get_or_compute(key, lambda: self.compute_shared(repr(key), compute, keep), keep)
+
+    def claim(self, name):
+        # Ours if the key is new, its owner stalled, or its stored result isn't reusable
+        now, db = time.time(), self.connect()
+        if db.execute("INSERT OR IGNORE INTO signals (key, leased_at) VALUES (?, ?)", (name, now)).rowcount: return True
+        return db.execute(
+            "UPDATE signals SET result = NULL, kept = 0, leased_at = ? WHERE key = ? AND ((result IS NULL AND leased_at < ?) OR kept = 0 AND result IS NOT NULL)",
+            (now, name, now - self.lease)
+        ).rowcount == 1
+
+    def lookup(self, name):
+        return self.connect().execute("SELECT result, kept FROM signals WHERE key = ?", (name,)).fetchone()
+
+    def release(self, name):
+        self.connect().execute("DELETE FROM signals WHERE key = ? AND result IS NULL", (name,))
+
+    def store(self, name, result, keep):
+        db = self.connect()
+        db.execute("UPDATE signals SET result = ?, kept = ? WHERE key = ?",
+                   (json.dumps(result, default=float), int(keep is None or keep(result)), name))
+        db.execute("DELETE FROM signals WHERE leased_at < ?", (time.time() - SIGNAL_TTL,))
+
+    async def compute_shared(self, name, compute, keep):
+        # Every SQLite call goes through STATE_POOL: another worker holding the write lock
+        # (up to timeout=10) stalls a state thread, never this worker's event loop
+        waited = False
+        while True:
+            row = await run_stage(STATE_POOL, self.lookup, name)
+            # A reusable result, or the answer of the worker we have been waiting on
+            if row and row[0] is not None and (row[1] or waited):
+                if waited: self.remote_waits += 1
+                else: self.shared_hits += 1
+                return json.loads(row[0])
+            if await run_stage(STATE_POOL, self.claim, name): break
+            waited = True
+            await asyncio.sleep(SIGNAL_POLL)
+
+        try: result = await compute()
+        except asyncio.CancelledError:
+            # Not awaited: a cancelled task may not get to resume, the lease must go regardless
+            STATE_POOL.submit(self.release, name)
+            raise
+        except Exception:
+            await run_stage(STATE_POOL, self.release, name) # Release the lease
+            raise
+        await run_stage(STATE_POOL, self.store, name, result, keep)
+        return result
+
+    def stats(self):
+        stats = super().stats()
+        lookups = self.hits + self.misses + self.coalesced
+        served = self.hits + self.coalesced + self.shared_hits + self.remote_waits
+        return dict(stats, shared_hits=self.shared_hits, remote_waits=self.remote_waits,
+                    hit_rate=round(served / lookups, 4) if lookups else 0.0)
+
+def settled(result):
+    # Deadline fallbacks are served but not memoized: the late LLM answer should win next time
+    sources = [result.get("details", {}).get("Source")] + [a["details"].get("Source") for a in result.get("assets", {}).values()]
+    return "ENSEMBLE_DEADLINE" not in sources
+
+# --- 4. MODEL FLEET (Loaded on first use, hot-swapped when retrained) ---
+FLEET_TICKERS = ["BTC-USD", "ETH-USD", "SOL-USD", "DOGE-USD"]
+MODEL_MMAP = "r" # Share read-only model pages between uvicorn workers (None = private copy)
+MODEL_WATCH_SECONDS = 30 # How often the watcher stats model files for a new version
+LSTM_WEIGHT = float(os.environ.get("LSTM_WEIGHT", "0")) # Share of the ML vote given to the LSTM (0 = reported only)
+
+def mtime_ns(path):
+    try: return os.stat(path).st_mtime_ns
+    except OSError: return 0
+
+def validate_model(model):
+    """A candidate must answer P(DOWN), P(UP) for a live-shaped row before it may serve."""
+    classes = [int(c) for c in model.classes_]
+    if classes != [0, 1]: raise ValueError(f"unexpected classes {classes}")
+    # Typical live values of Log_Ret, Vol, RSI, Momentum
+    probe = np.array([[0.0, 0.004, 50.0, 0.0], [-0.01, 0.01, 20.0, -0.02], [0.01, 0.01, 80.0, 0.02]])
+    proba = np.asarray(model.predict_proba(probe))
+    if proba.shape != (len(probe), 2) or not np.all(np.isfinite(proba)) or not np.allclose(proba.sum(axis=1), 1.0):
+        raise ValueError(f"bad probabilities {proba.tolist()}")
+
+class ModelFleet:
+    """Versioned ticker -> forest registry.
+
+    Nothing is read from disk until a ticker is first scored. A new model file
+    (train_fleet.py writes atomically) is loaded and validated off to the side and
+    then swapped in with one reference assignment: requests already holding the old
+    forest finish on it, later ones get the new one.
+    """
+    def __init__(self, tickers, mmap_mode=MODEL_MMAP):
+        self.tickers = list(tickers)
+        self.mmap_mode = mmap_mode
+        self.paths = {t: f"model_{t}.pkl" for t in tickers if os.path.exists(f"model_{t}.pkl")}
+        self.loaded = {}
+        self.versions = {}  # ticker -> on-disk version of the loaded forest
+        self.rejected = {}  # ticker -> version that failed validation (not retried)
+        self.lock = threading.Lock()
+        self.thread = None
+        for t in tickers:
+            if t not in self.paths: print(f"⚠️ Missing: {t}")
+
+    def __contains__(self, ticker): return ticker in self.paths
+    def __iter__(self): return iter(self.paths)
+    def __len__(self): return len(self.paths)
+
+    def disk_version(self, ticker):
+        # Newest of the pickle and its compact export; both are replaced atomically by training
+        return max(mtime_ns(f"model_{ticker}.pkl"), mtime_ns(compact_path(ticker)))
+
+    def version(self, ticker):
+        return self.versions.get(ticker) or self.disk_version(ticker)
+
+    def get(self, ticker, default=None):
+        if ticker not in self.paths: return default
+        if ticker not in self.loaded:
+            with self.lock:
+                if ticker not in self.loaded:
+                    version = self.disk_version(ticker)
+                    self.loaded[ticker] = self.first_load(ticker, version)
+                    self.versions[ticker] = version
+        return self.loaded[ticker]
+
+    def first_load(self, ticker, version):
+        # Same validation as a hot swap; a rejected model falls back to the last good export
+        if self.rejected.get(ticker) != version:
+            try: return self.load(ticker)
+            except Exception as e:
+                self.rejected[ticker] = version
+                print(f"❌ Rejected {ticker} model v{version}: {e}")
+        compact = compact_path(ticker)
+        if not os.path.isdir(compact): raise ValueError(f"{ticker} model v{version} was rejected and has no earlier export")
+        forest = CompactForest.load(compact, mmap_mode=self.mmap_mode)
+        validate_model(forest)
+        print(f"↩️ Serving the last good {ticker} export: {compact}")
+        return forest
+
+    def load(self, ticker):
+        """The current on-disk forest for ticker, validated. Raises if it is unusable."""
+        pkl, compact = self.paths[ticker], compact_path(ticker)
+        # Prefer the flat-array export (train_fleet.py / forest.py write it) unless the pickle was retrained since
+        if os.path.isdir(compact) and os.path.getmtime(compact) >= os.path.getmtime(pkl):
+            try:
+                print(f"🗺️ Mapping compact model: {compact}")
+                forest = CompactForest.load(compact, mmap_mode=self.mmap_mode)
+                validate_model(forest)
+                return forest
+            except Exception as e:
+                print(f"⚠️ Compact model unusable ({e}), falling back to {pkl}")
+        print(f"🏗️ Loading model: {pkl}")
+        # The pickle is always read into private memory; compiled to packed node arrays it gives
+        # the same probabilities without sklearn's per-call overhead
+        model = joblib.load(pkl)
+        validate_model(model) # Before the export: a bad pickle must never replace a good compact copy
+        if self.mmap_mode:
+            # Export once, so this and every other worker map shared pages from now on. Stamped
+            # with the pickle's mtime: the version is unchanged and the export counts as current
+            try:
+                stamp = mtime_ns(pkl)
+                export_compact(model, compact)
+                os.utime(compact, ns=(stamp, stamp))
+                print(f"💾 Compact Saved: {compact}")
+                return CompactForest.load(compact, mmap_mode=self.mmap_mode)
+            except Exception as e:
+                print(f"⚠️ Compact export failed ({e}), serving a private copy")
+        return CompactForest.from_model(model)
+
+    def reload(self, ticker):
+        """Loads + validates the on-disk model, then swaps it in. Returns the new version."""
+        if ticker not in self.tickers: raise KeyError(f"{ticker} is not in the fleet")
+        if ticker not in self.paths:
+            if not os.path.exists(f"model_{ticker}.pkl"): raise FileNotFoundError(f"model_{ticker}.pkl")
+            self.paths[ticker] = f"model_{ticker}.pkl" # Fleet asset trained after startup
+        version = self.disk_version(ticker)
+        try: candidate = self.load(ticker)
+        except Exception:
+            self.rejected[ticker] = version
+            raise
+        with self.lock:
+            self.loaded[ticker] = candidate
+            self.versions[ticker] = version
+        print(f"🔁 Swapped in {ticker} model v{version}")
+        return version
+
+    def check_updates(self):
+        """Reloads every loaded (or newly appeared) model whose files changed on disk."""
+        swapped = {}
+        for ticker in self.tickers:
+            version = self.disk_version(ticker)
+            if not version or version == self.rejected.get(ticker): continue
+            fresh = ticker not in self.paths
+            if not fresh and (ticker not in self.loaded or self.versions.get(ticker) == version): continue
+            try: swapped[ticker] = self.reload(ticker)
+            except Exception as e: print(f"❌ Rejected new {ticker} model: {e} (still serving the previous one)")
+        return swapped
+
+    def watch(self, every=MODEL_WATCH_SECONDS):
+        if self.thread: return
+        def loop():
+            while True:
+                time.sleep(every)
+                try: self.check_updates()
+                except Exception as e: print(f"⚠️ Model watch failed: {e}")
+        self.thread = threading.Thread(target=loop, name="model-watcher", daemon=True)
+        self.thread.start()
+
+    def stats(self):
+        return {t: {"loaded": t in self.loaded, "version": self.version(t), "rejected": self.rejected.get(t)} for t in self.paths}
+
+# --- 5. THE HYBRID AGENT ---
+def ensemble_signal(final_score):
+    # ML/RSI blend used whenever the LLM has no opinion
+    if final_score > 0.15: return "BUY", 50 + (final_score * 50)
+    if final_score < -0.15: return "SELL", 50 + (abs(final_score) * 50)
+    return "WAIT", 0
+
+DEFAULTS_SCHEMA = "CREATE TABLE IF NOT EXISTS defaults (name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+
+class AgentDefaults:
+    """Asset focus + risk weight for requests that don't name their own, kept next to the
+    portfolio so /set_asset and /set_risk on any worker change them for every worker."""
+    def __init__(self, path="portfolio.db", ticker="BTC-USD", risk_weight=0.6):
+        self.path = path
+        self.initial = {"ticker": ticker, "risk_weight": risk_weight}
+        self.connect().execute(DEFAULTS_SCHEMA)
+
+    def connect(self):
+        return state_db(self.path)
+
+    def get(self, name):
+        row = self.connect().execute("SELECT value FROM defaults WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else self.initial[name]
+
+    def set(self, name, value):
+        self.connect().execute("INSERT OR REPLACE INTO defaults (name, value) VALUES (?, ?)", (name, json.dumps(value)))
+
 class HybridAgent:
     def __init__(self):
         self.processor = DataProcessor()
-        self.portfolio = PortfolioManager() # <--- Connect Portfolio
-        self.models = {}
-        self.current_ticker = "BTC-USD"
-        self.risk_weight = 0.6 
+        self.sequence = load_scorer(os.environ.get("LSTM_CHECKPOINT", LSTM_CHECKPOINT))
         self.load_fleet()
 
+    # State files open on first use, not at import: train_fleet.py / backtest.py / train.py import
+    # this module for DataProcessor and must never open (or migrate) the live portfolio
+    @cached_property
+    def portfolio(self): return PortfolioManager(state_path("portfolio.db"), state_path("portfolio.json")) # <--- Connect Portfolio
+
+    @cached_property
+    def defaults(self): return AgentDefaults(state_path("portfolio.db"))
+
+    @cached_property
+    def signal_cache(self): return SharedSignalCache(state_path("signals.db"))
+
     def load_fleet(self):
-        tickers = ["BTC-USD", "ETH-USD", "SOL-USD", "DOGE-USD"]
-        print("🏗️ Loading Model Fleet...")
-        for t in tickers:
-            path = f"model_{t}.pkl"
-            if os.path.exists(path):
-                self.models[t] = joblib.load(path)
-            else:
-                print(f"⚠️ Missing: {t}")
+        # Lazy: only resolves paths here, forests are loaded by the first request that needs them
+        self.models = ModelFleet(FLEET_TICKERS)
 
+    # Shared defaults for requests that don't name their own ticker / risk (one SQLite write each)
     def set_asset(self, ticker):
         if ticker in self.models:
-            self.current_ticker = ticker
+            self.defaults.set("ticker", ticker)
             print(f"🔄 Switched Agent Focus to: {ticker}")
             return True
         return False
 
     def set_risk(self, level):
         try:
-            self.risk_weight = float(level)
+            self.defaults.set("risk_weight", self.settings(risk_weight=level)[1])
             return True
         except: return False
 
-    def predict_next_move(self, current_price_seq=None):
-        df = self.processor.fetch_live_data(ticker=self.current_ticker)
-        if df is None: return {"signal": "ERROR", "confidence": 0}
+    @property
+    def current_ticker(self): return self.defaults.get("ticker")
 
-        df = self.processor.add_indicators(df)
-        last_row = df.iloc[-1]
-        current_price = last_row['Close']
-        
-        # 1. CHECK PORTFOLIO FIRST (Auto-Sell Rule)
-        # Every time we scan, we check if we should take profit on existing trades
-        realized_profit = self.portfolio.check_exit(self.current_ticker, current_price)
-        stats = self.portfolio.get_stats()
+    @property
+    def risk_weight(self): return self.defaults.get("risk_weight")
+
+    def settings(self, ticker=None, risk_weight=None):
+        """Resolves one request's (ticker, risk_weight), falling back to the shared defaults. Raises ValueError."""
+        # Only an omitted value costs a (WAL, never lock-waiting) read of the defaults table
+        ticker = self.current_ticker if ticker is None else ticker
+        risk_weight = self.risk_weight if risk_weight is None else float(risk_weight)
+        if ticker not in self.models: raise ValueError(f"Unknown asset: {ticker}")
+        if not 0.0 <= risk_weight <= 1.0: raise ValueError(f"Risk must be within [0, 1], got {risk_weight}")
+        return ticker, risk_weight
+
+    def prepare_data(self, ticker):
+        return self.processor.get_live_features(ticker=ticker)
 
-        # 2. RUN ANALYSIS
-        current_model = self.models.get(self.current_ticker)
-        features = df[['Log_Ret', 'Vol', 'RSI', 'Momentum']].iloc[-1].values.reshape(1, -1)
+    def sequence_scores(self, frames):
+        # One batched LSTM step for every ticker in frames -> {ticker: P(up)}; never fails a signal
+        if self.sequence is None: return {}
+        try: return self.sequence.predict_many(frames)
+        except Exception as e:
+            print(f"⚠️ LSTM scoring failed: {e}")
+            return {}
+
+    def analyze(self, df, ticker, risk_weight, lstm_up=None):
+        last_row = df.iloc[-1]
+        current_model = self.models.get(ticker)
+        features = df[FEATURE_COLS].iloc[-1].values.reshape(1, -1)
         
         ml_vote = 0
         ml_signal = "NEUTRAL"
@@ -171,6 +692,9 @@ class HybridAgent:
         
         if current_model:
             probs = current_model.predict_proba(features)[0]
+            if lstm_up is not None and LSTM_WEIGHT:
+                p_up = (1 - LSTM_WEIGHT) * probs[1] + LSTM_WEIGHT * lstm_up
+                probs = [1 - p_up, p_up]
             if probs[1] > 0.5:
                 ml_signal, ml_conf = "BUY", round(probs[1] * 100, 1)
                 ml_vote = 1
@@ -182,58 +706,70 @@ class HybridAgent:
         if last_row['RSI'] < 30: logic_vote = 1
         elif last_row['RSI'] > 70: logic_vote = -1
 
-        ml_w = self.risk_weight
-        logic_w = 1.0 - self.risk_weight
+        ml_w = risk_weight
+        logic_w = 1.0 - risk_weight
         final_score = (ml_vote * ml_w) + (logic_vote * logic_w)
 
         risk_mode = "BALANCED"
-        if self.risk_weight >= 0.8: risk_mode = "DEGEN"
-        elif self.risk_weight <= 0.3: risk_mode = "SAFE"
+        if risk_weight >= 0.8: risk_mode = "DEGEN"
+        elif risk_weight <= 0.3: risk_mode = "SAFE"
 
         market_packet = {
-            "ticker": self.current_ticker,
+            "ticker": ticker,
             "risk_mode": risk_mode,
             "ml_signal": ml_signal,
             "ml_conf": ml_conf,
             "rsi": round(last_row['RSI'], 2),
             "momentum": round(last_row['Momentum'], 4),
             "volatility": round(last_row['Vol'], 4),
-            "recent_returns": round(last_row['Log_Ret'] * 100, 2)
+            "recent_returns": round(last_row['Log_Ret'] * 100, 2),
+            "lstm_up": round(lstm_up * 100, 1) if lstm_up is not None else None
+        }
+        return {
+            "ticker": ticker,
+            "current_price": last_row['Close'],
+            "final_score": final_score,
+            "risk_mode": risk_mode,
+            "market_packet": market_packet
         }
 
-        # 3. BRAIN DECISION
-        decision = llm_brain.get_decision(market_packet)
-        
+    def check_portfolio(self, ticker, current_price):
+        # Every time we scan, we check if we should take profit on existing trades
+        realized_profit = self.portfolio.check_exit(ticker, current_price)
+        return realized_profit, self.portfolio.get_stats()
+
+    def resolve(self, analysis, decision):
+        # decision is None when the LLM missed the request's deadline
+        risk_mode = analysis["risk_mode"]
+        if decision is None:
+            final_signal, final_conf = ensemble_signal(analysis["final_score"])
+            return final_signal, final_conf, f"LLM too slow. Using {risk_mode} weights.", "ENSEMBLE_DEADLINE"
         if decision.get("confidence") == 0:
-             if final_score > 0.15: final_signal = "BUY"; final_conf = 50 + (final_score * 50)
-             elif final_score < -0.15: final_signal = "SELL"; final_conf = 50 + (abs(final_score) * 50)
-             else: final_signal = "WAIT"; final_conf = 0
-             reasoning = f"LLM Offline. Using {risk_mode} weights."
-        else:
-             final_signal = decision.get("signal", "WAIT")
-             final_conf = decision.get("confidence", 0)
-             reasoning = decision.get("reasoning", "Analysis complete.")
+            final_signal, final_conf = ensemble_signal(analysis["final_score"])
+            return final_signal, final_conf, f"LLM Offline. Using {risk_mode} weights.", "ENSEMBLE_FALLBACK"
+        return decision.get("signal", "WAIT"), decision.get("confidence", 0), decision.get("reasoning", "Analysis complete."), "LLM"
+
+    def finalize(self, analysis, decision, news, realized_profit, stats, trade_key=None):
+        ticker = analysis["ticker"]
+        current_price = analysis["current_price"]
+        market_packet = analysis["market_packet"]
 
-        # 4. EXECUTE TRADE (Paper Trading)
-        # ... (Previous code remains the same)
+        final_signal, final_conf, reasoning, source = self.resolve(analysis, decision)
 
         # 4. EXECUTE TRADE (DEBUG MODE)
         # We print exactly what the Agent is seeing so you can fix the threshold.
         print(f"\n🧐 DEBUG: Signal={final_signal} | Conf={final_conf} | Threshold=10 (TEST)")
         
         trade_status = "Scanning"
-        # --- CHEAT CODE: FORCE BUY ---
-        # Uncomment the next two lines to force a buy on the next scan:
-        
         # TEST RULE: Buy if Signal is BUY and Confidence > 10% (Very Low for Testing)
         if final_signal == "BUY" and float(final_conf) > 10:
             print("🟢 TRIGGER: Buying Condition MET!")
-            if self.portfolio.execute_buy(self.current_ticker, current_price):
+            if self.portfolio.execute_buy(ticker, current_price, trade_key):
                 trade_status = "OPENED POSITION ($1000)"
-                print(f"✅ SUCCESS: Bought {self.current_ticker} at ${current_price}")
+                print(f"✅ SUCCESS: Bought {ticker} at ${current_price}")
             else:
                 trade_status = "INSUFFICIENT FUNDS"
-                print("❌ FAIL: Not enough fake money in portfolio.json")
+                print("❌ FAIL: Not enough fake money in portfolio.db")
         else:
             print("🔴 SKIPPED: Buying Condition NOT met.")
 
@@ -242,27 +778,115 @@ class HybridAgent:
             reasoning = f"💰 PROFIT TAKEN! Sold position for +${round(realized_profit, 2)}. " + reasoning
             print(f"🎉 SELLING: Realized Profit of ${realized_profit}")
 
-        # ... (Return statement remains the same)
-
         return {
             "signal": final_signal,
             "confidence": round(float(final_conf), 1),
             "market_price": round(current_price, 2),
             "details": {
-                "Asset": self.current_ticker,
-                
-                # --- I FORGOT THESE LINES IN THE LAST UPDATE ---
-                "Momentum": market_packet['momentum'],   # <--- RESTORED
-                "Volatility": market_packet['volatility'], # <--- RESTORED
-                
+                "Asset": ticker,
+                "Momentum": market_packet['momentum'],
+                "Volatility": market_packet['volatility'],
                 "RSI": market_packet['rsi'],
-                "News": llm_brain.fetch_news(self.current_ticker),
+                "LSTM": market_packet['lstm_up'],
+                "News": news,
                 "Reasoning": reasoning,
                 "Balance": stats["balance"],
                 "Equity": stats["equity"],
                 "PnL": stats["pnl_pct"],
-                "TradeStatus": trade_status
+                "TradeStatus": trade_status,
+                "Source": source
             }
         }
 
+    def predict_next_move(self, ticker=None, risk_weight=None):
+        ticker, risk_weight = self.settings(ticker, risk_weight)
+        df = self.prepare_data(ticker)
+        if df is None: return {"signal": "ERROR", "confidence": 0}
+
+        analysis = self.analyze(df, ticker, risk_weight, self.sequence_scores({ticker: df}).get(ticker))
+        # 1. CHECK PORTFOLIO FIRST (Auto-Sell Rule)
+        realized_profit, stats = self.check_portfolio(ticker, analysis["current_price"])
+        # 2. BRAIN DECISION
+        decision = llm_brain.get_decision(analysis["market_packet"])
+        news = llm_brain.fetch_news(ticker)
+        # 3. EXECUTE TRADE (Paper Trading)
+        return self.finalize(analysis, decision, news, realized_profit, stats)
+
+    @timed("signal")
+    async def predict_next_move_async(self, ticker=None, risk_weight=None, budget=SIGNAL_BUDGET):
+        # Same pipeline as predict_next_move, but every blocking stage runs off the event loop.
+        # Settings are read once here and passed down: concurrent requests never see each other's
+        deadline = asyncio.get_running_loop().time() + budget
+        ticker, risk_weight = self.settings(ticker, risk_weight)
+        df = await run_stage(DATA_POOL, self.prepare_data, ticker)
+        if df is None: return {"signal": "ERROR", "confidence": 0}
+
+        # Inputs only change when a new candle closes (or the model is swapped) -> every buyer in this bar shares one run
+        key = (ticker, df.index[-1], risk_weight, self.models.version(ticker))
+        return await self.signal_cache.get_or_compute(key, lambda: self.compute_signal(df, ticker, risk_weight, deadline, repr(key)), keep=settled)
+
+    async def compute_signal(self, df, ticker, risk_weight, deadline, trade_key=None):
+        # A deadline fallback isn't memoized, so the same key can be computed again: the
+        # paper buy is keyed separately (trade_key) and still happens at most once
+        lstm_up = (await run_stage(MODEL_POOL, self.sequence_scores, {ticker: df})).get(ticker)
+        analysis = await run_stage(MODEL_POOL, self.analyze, df, ticker, risk_weight, lstm_up)
+        # Hedge: the LLM races the deadline while the local ensemble answer is already in hand
+        llm_task = asyncio.ensure_future(run_stage(LLM_POOL, llm_brain.get_decision, analysis["market_packet"]))
+        (realized_profit, stats), decision = await asyncio.gather(
+            run_stage(PORTFOLIO_POOL, self.check_portfolio, ticker, analysis["current_price"]),
+            within_deadline(llm_task, deadline),
+        )
+        news = llm_brain.fetch_news(ticker) # Memory only; "Newsfeed offline." until the poller has succeeded
+        return await run_stage(PORTFOLIO_POOL, self.finalize, analysis, decision, news, realized_profit, stats, trade_key)
+
+    @timed("fleet_scan")
+    async def scan_fleet_async(self, risk_weight=None, budget=SIGNAL_BUDGET):
+        # Fleet scan: every model in one paid call (batched download, parallel predict_proba)
+        deadline = asyncio.get_running_loop().time() + budget
+        risk_weight = self.settings(risk_weight=risk_weight)[1]
+        frames = await run_stage(DATA_POOL, self.processor.get_fleet_features, list(self.models))
+        if not frames: return {"signal": "ERROR", "confidence": 0}
+
+        key = ("FLEET", max(df.index[-1] for df in frames.values()), risk_weight, tuple(self.models.version(t) for t in frames))
+        return await self.signal_cache.get_or_compute(key, lambda: self.compute_fleet(frames, risk_weight, deadline), keep=settled)
+
+    async def compute_fleet(self, frames, risk_weight, deadline):
+        # The LSTM advances every ticker in one batched step; the forests then run in parallel
+        lstm = await run_stage(MODEL_POOL, self.sequence_scores, frames)
+        analyses = await asyncio.gather(*[
+            run_stage(MODEL_POOL, self.analyze, df, ticker, risk_weight, lstm.get(ticker)) for ticker, df in frames.items()
+        ])
+        # Every ticker's LLM decision comes from ONE batched prompt (cache hits skip it entirely)
+        llm_task = asyncio.ensure_future(run_stage(LLM_POOL, llm_brain.get_decisions, [a["market_packet"] for a in analyses]))
+        stats, decisions = await asyncio.gather(
+            run_stage(PORTFOLIO_POOL, self.portfolio.get_stats),
+            within_deadline(llm_task, deadline),
+        )
+        if decisions is None: decisions = [None] * len(analyses)
+
+        assets = {}
+        for analysis, decision in zip(analyses, decisions):
+            signal, conf, reasoning, source = self.resolve(analysis, decision)
+            packet = analysis["market_packet"]
+            assets[analysis["ticker"]] = {
+                "signal": signal,
+                "confidence": round(float(conf), 1),
+                "market_price": round(analysis["current_price"], 2),
+                "details": {
+                    "ML": f"{packet['ml_signal']} ({packet['ml_conf']}%)",
+                    "Momentum": packet['momentum'],
+                    "Volatility": packet['volatility'],
+                    "RSI": packet['rsi'],
+                    "LSTM": packet['lstm_up'],
+                    "Reasoning": reasoning,
+                    "Source": source
+                }
+            }
+        return {
+            "signal": "FLEET",
+            "risk_mode": analyses[0]["risk_mode"],
+            "assets": assets,
+            "details": {"Balance": stats["balance"], "Equity": stats["equity"], "PnL": stats["pnl_pct"]}
+        }
+
 predictor = HybridAgent()
\ No newline at end of file
@@ -0,0 +1,247 @@
+import re
+import time
+import asyncio
+from collections import OrderedDict
+import aiohttp
+from metrics import timed, span, registry
+from state_db import state_db
+
+# --- PAYMENT VERIFICATION (x402 USDC transfers) ---
+TRANSFER_SELECTOR = "0xa9059cbb"
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef" # keccak("Transfer(address,address,uint256)")
+VERIFIED, PENDING, INVALID, SPENT = "verified", "pending", "invalid", "spent"
+RPC_BATCH_WINDOW = 0.02  # Seconds to gather lookups from concurrent buyers into one JSON-RPC batch
+RPC_BATCH_MAX = 100
+BLOCK_POLL = 2.0         # Base produces a block every ~2s
+LOG_RANGE = 500          # Max blocks per eth_getLogs call
+WATCH_LOOKBACK = 300     # Blocks scanned behind the head on startup
+LOOKUP_AFTER = 15.0      # Unseen by the watcher this long -> one direct receipt lookup (old tx, restart)
+TX_HASH = re.compile(r"0x[0-9a-f]{64}")
+INVALID_PARAMS = -32602  # JSON-RPC: the node refused the arguments (e.g. a malformed hash), not an outage
+
+def normalize_hash(tx_hash):
+    tx_hash = str(tx_hash).strip().lower()
+    return tx_hash if tx_hash.startswith("0x") else "0x" + tx_hash
+
+class RpcError(RuntimeError):
+    """An error reply from the node (as opposed to not reaching it)."""
+    def __init__(self, method, error):
+        self.code = error.get("code") if isinstance(error, dict) else None
+        super().__init__(f"RPC {method}: {error}")
+
+def check_transfer(tx, seller, usdc, min_amount=0):
+    """True if tx is a USDC transfer(...) call paying the seller at least min_amount (6-decimal units)."""
+    input_data = tx.get('input') or tx.get('data') or ""
+    if hasattr(input_data, 'hex'): input_data = input_data.hex()
+    input_data = str(input_data).lower()
+    if not input_data.startswith("0x"): input_data = "0x" + input_data
+
+    if str(tx.get('to') or "").lower() != usdc.lower(): return False
+    if not input_data.startswith(TRANSFER_SELECTOR): return False
+    params = input_data[10:]
+    if ("0x" + params[24:64]).lower() != seller.lower(): return False
+    return int(params[64:128] or "0", 16) >= min_amount
+
+class RpcBatcher:
+    """Coalesces JSON-RPC calls issued within a short window into one batch HTTP request."""
+    def __init__(self, rpc_url, window=RPC_BATCH_WINDOW, max_batch=RPC_BATCH_MAX):
+        self.rpc_url = rpc_url
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = []
+        self.flush_scheduled = False
+        self.session = None
+        self.batches = 0
+        self.calls = 0
+
+    async def call(self, method, params):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(({"jsonrpc": "2.0", "method": method, "params": params}, future))
+        if len(self.pending) >= self.max_batch: asyncio.ensure_future(self.flush())
+        elif not self.flush_scheduled:
+            self.flush_scheduled = True
+            asyncio.get_running_loop().call_later(self.window, lambda: asyncio.ensure_future(self.flush()))
+        return await future
+
+    async def flush(self):
+        self.flush_scheduled = False
+        batch, self.pending = self.pending[:self.max_batch], self.pending[self.max_batch:]
+        if not batch: return
+        if self.pending and not self.flush_scheduled: # Overflow goes out right after
+            self.flush_scheduled = True
+            asyncio.get_running_loop().call_soon(lambda: asyncio.ensure_future(self.flush()))
+
+        payload = []
+        for i, (request, future) in enumerate(batch):
+            payload.append(dict(request, id=i))
+            registry.count("rpc_calls_total", method=request["method"])
+        self.batches += 1
+        self.calls += len(batch)
+        try:
+            if self.session is None or self.session.closed: self.session = aiohttp.ClientSession()
+            with span("rpc_batch"):
+                async with self.session.post(self.rpc_url, json=payload, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+                    replies = await resp.json(content_type=None)
+            if isinstance(replies, dict): replies = [replies] # Some nodes answer a 1-item batch unwrapped
+            by_id = {r.get("id"): r for r in replies}
+            for i, (request, future) in enumerate(batch):
+                reply = by_id.get(i, {"error": "missing reply"})
+                if future.done(): continue
+                if "error" in reply: future.set_exception(RpcError(request["method"], reply["error"]))
+                else: future.set_result(reply.get("result"))
+        except Exception as e:
+            registry.count("rpc_errors_total")
+            for request, future in batch:
+                if not future.done(): future.set_exception(e)
+
+class SpentIndex:
+    """Persistent set of tx hashes that already bought a signal (replay protection)."""
+    def __init__(self, path="payments.db"):
+        self.path = path
+        self.connect().execute("CREATE TABLE IF NOT EXISTS spent (tx_hash TEXT PRIMARY KEY, spent_at REAL NOT NULL)")
+
+    def connect(self):
+        return state_db(self.path)
+
+    def contains(self, tx_hash):
+        return self.connect().execute("SELECT 1 FROM spent WHERE tx_hash = ?", (tx_hash,)).fetchone() is not None
+
+    def claim(self, tx_hash):
+        # Atomic: exactly one caller ever gets True for a given hash
+        return self.connect().execute("INSERT OR IGNORE INTO spent (tx_hash, spent_at) VALUES (?, ?)", (tx_hash, time.time())).rowcount == 1
+
+    def release(self, tx_hash):
+        # Undo a claim whose signal could not be delivered, so the buyer can retry with the same payment
+        self.connect().execute("DELETE FROM spent WHERE tx_hash = ?", (tx_hash,))
+
+class PaymentWatcher:
+    """Follows new blocks once and records every USDC Transfer to the seller.
+
+    One eth_getLogs per block range serves all waiting buyers, so the RPC cost scales
+    with blocks, not with the number of pending payments.
+    """
+    def __init__(self, rpc, seller, usdc, min_amount=0, poll=BLOCK_POLL, max_seen=50_000):
+        self.rpc = rpc
+        self.seller_topic = "0x" + seller.lower().replace("0x", "").rjust(64, "0")
+        self.usdc = usdc
+        self.min_amount = min_amount
+        self.poll = poll
+        self.max_seen = max_seen
+        self.seen = OrderedDict() # tx_hash -> VERIFIED, or INVALID if it paid less than min_amount
+        self.last_block = None
+        self.task = None
+
+    def status(self, tx_hash):
+        return self.seen.get(tx_hash) # None = not seen (yet)
+
+    def start(self):
+        if self.task is None: self.task = asyncio.ensure_future(self.loop())
+
+    async def loop(self):
+        while True:
+            try: await self.scan()
+            except Exception as e: print(f"⚠️ Payment watcher scan failed: {e}")
+            await asyncio.sleep(self.poll)
+
+    @timed("payment_watch_scan")
+    async def scan(self):
+        head = int(await self.rpc.call("eth_blockNumber", []), 16)
+        if self.last_block is None: self.last_block = max(head - WATCH_LOOKBACK, -1)
+        while self.last_block < head:
+            start, end = self.last_block + 1, min(self.last_block + LOG_RANGE, head)
+            logs = await self.rpc.call("eth_getLogs", [{
+                "fromBlock": hex(start), "toBlock": hex(end), "address": self.usdc,
+                "topics": [TRANSFER_TOPIC, None, self.seller_topic]
+            }])
+            for log in logs or []:
+                # Only successful transactions emit logs, so a Transfer here is a settled payment
+                amount = int(log.get("data") or "0x0", 16)
+                self.seen[normalize_hash(log["transactionHash"])] = VERIFIED if amount >= self.min_amount else INVALID
+            while len(self.seen) > self.max_seen: self.seen.popitem(last=False)
+            self.last_block = end
+
+class PaymentVerifier:
+    def __init__(self, rpc_url, seller, usdc, min_amount=0, spent_path="payments.db", cache_size=4096):
+        self.seller = seller
+        self.usdc = usdc
+        self.min_amount = min_amount # Price in USDC base units (6 decimals); smaller transfers are INVALID
+        self.rpc = RpcBatcher(rpc_url)
+        self.spent = SpentIndex(spent_path)
+        self.watcher = PaymentWatcher(self.rpc, seller, usdc, min_amount)
+        self.results = OrderedDict() # tx_hash -> final status (verified / invalid), LRU
+        self.asked = OrderedDict()   # tx_hash -> [first asked, last direct lookup] while pending
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+
+    def remember(self, tx_hash, status):
+        if status == PENDING: return # Pending is re-checked, never cached
+        self.results[tx_hash] = status
+        self.results.move_to_end(tx_hash)
+        while len(self.results) > self.cache_size: self.results.popitem(last=False)
+
+    @timed("rpc_lookup")
+    async def lookup(self, tx_hash):
+        # Receipt + transaction ride in the same batch as every other buyer's lookups
+        receipt, tx = await asyncio.gather(
+            self.rpc.call("eth_getTransactionReceipt", [tx_hash]),
+            self.rpc.call("eth_getTransactionByHash", [tx_hash]),
+        )
+        if receipt is None or tx is None: return PENDING
+        if int(str(receipt.get("status", "0x0")), 16) != 1: return INVALID
+        return VERIFIED if check_transfer(tx, self.seller, self.usdc, self.min_amount) else INVALID
+
+    @timed("verify_payment")
+    async def check(self, tx_hash):
+        """Non-blocking status for /signal: O(1) against the watcher, PENDING until it sees the transfer."""
+        tx_hash = normalize_hash(tx_hash)
+        # Not a transaction hash at all: refuse it outright instead of leaving it pending forever
+        if not TX_HASH.fullmatch(tx_hash): return INVALID
+        if self.spent.contains(tx_hash): return SPENT
+        if tx_hash in self.results:
+            self.hits += 1
+            return self.results[tx_hash]
+        status = self.watcher.status(tx_hash)
+        if status is not None:
+            self.hits += 1
+            self.remember(tx_hash, status)
+            self.asked.pop(tx_hash, None)
+            return status
+
+        # Not in the watched range (older tx, restart) or not a plain Transfer: look it up directly, rarely
+        now = time.time()
+        first, last = self.asked.setdefault(tx_hash, [now, 0])
+        while len(self.asked) > self.cache_size: self.asked.popitem(last=False)
+        if now - first < LOOKUP_AFTER or now - last < LOOKUP_AFTER: return PENDING
+        self.asked[tx_hash][1] = now
+        self.misses += 1
+        try: status = await self.lookup(tx_hash)
+        except RpcError as e:
+            print(f"⚠️ RPC lookup failed: {e}")
+            if e.code != INVALID_PARAMS: return PENDING
+            status = INVALID # The node says this hash can't exist
+        except Exception as e:
+            print(f"⚠️ RPC lookup failed: {e}")
+            return PENDING # Node unreachable: retry later
+        self.remember(tx_hash, status)
+        if status != PENDING: self.asked.pop(tx_hash, None)
+        return status
+
+    def claim(self, tx_hash):
+        return self.spent.claim(normalize_hash(tx_hash))
+
+    def release(self, tx_hash):
+        self.spent.release(normalize_hash(tx_hash))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self.results),
+            "pending": len(self.asked),
+            "watched_block": self.watcher.last_block,
+            "rpc_batches": self.rpc.batches,
+            "rpc_calls": self.rpc.calls
+        }
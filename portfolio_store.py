@@ -0,0 +1,248 @@
+import os
+import json
+import time
+from datetime import datetime
+from state_db import state_db
+
+# --- PORTFOLIO STORE (SQLite, WAL mode) ---
+# Every trade is one small transaction instead of rewriting the whole portfolio file.
+# WAL lets readers keep going while a writer commits; BEGIN IMMEDIATE serializes writers.
+TAKE_PROFIT = 0.015  # +1.5%
+STOP_LOSS = -0.03    # -3%
+TRIGGER_SLACK = 1e-9 # Index lookups are widened by this much; the exact rule is re-checked in Python
+TRADE_KEY_TTL = 24 * 3600 # Seconds a signal key's trade outcome is remembered
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS account (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    balance REAL NOT NULL,
+    cost_basis REAL NOT NULL DEFAULT 0,
+    open_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS positions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticker TEXT NOT NULL,
+    entry_price REAL NOT NULL,
+    units REAL NOT NULL,
+    cost REAL NOT NULL,
+    timestamp TEXT NOT NULL,
+    tp_price REAL NOT NULL DEFAULT 0,
+    sl_price REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_positions_ticker ON positions (ticker);
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticker TEXT NOT NULL,
+    profit REAL NOT NULL,
+    exit_price REAL NOT NULL,
+    time TEXT NOT NULL,
+    closed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_ticker_time ON history (ticker, closed_at);
+CREATE INDEX IF NOT EXISTS idx_history_time ON history (closed_at);
+CREATE TABLE IF NOT EXISTS trade_keys (
+    key TEXT PRIMARY KEY, -- the signal's cache key: its paper buy is decided once, by whoever gets here first
+    opened INTEGER NOT NULL,
+    decided_at REAL NOT NULL
+);
+"""
+
+# Position book: per-ticker indexes sorted by trigger price, so an exit check only
+# visits positions whose take-profit / stop-loss the current price has crossed.
+BOOK_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_positions_tp ON positions (ticker, tp_price);
+CREATE INDEX IF NOT EXISTS idx_positions_sl ON positions (ticker, sl_price);
+"""
+# Per-ticker exposure: running units + cost basis, so equity can be marked to market in O(tickers)
+EXPOSURE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS exposure (
+    ticker TEXT PRIMARY KEY,
+    units REAL NOT NULL,
+    cost_basis REAL NOT NULL,
+    open_count INTEGER NOT NULL
+);
+"""
+SCHEMA_VERSION = 3
+
+class PortfolioStore:
+    def __init__(self, path="portfolio.db", starting_balance=10000.0):
+        self.path = path
+        self.connect().executescript(SCHEMA)
+        with self.transaction() as db:
+            db.execute("INSERT OR IGNORE INTO account (id, balance) VALUES (1, ?)", (starting_balance,))
+        self.upgrade()
+
+    def upgrade(self):
+        db = self.connect()
+        version = db.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION: return
+        db.executescript(EXPOSURE_SCHEMA)
+        with self.transaction() as db:
+            # v1 stores (no trigger prices / running totals): add and backfill them
+            columns = {r["name"] for r in db.execute("PRAGMA table_info(positions)")}
+            if "tp_price" not in columns:
+                db.execute("ALTER TABLE positions ADD COLUMN tp_price REAL NOT NULL DEFAULT 0")
+                db.execute("ALTER TABLE positions ADD COLUMN sl_price REAL NOT NULL DEFAULT 0")
+            columns = {r["name"] for r in db.execute("PRAGMA table_info(account)")}
+            if "cost_basis" not in columns:
+                db.execute("ALTER TABLE account ADD COLUMN cost_basis REAL NOT NULL DEFAULT 0")
+                db.execute("ALTER TABLE account ADD COLUMN open_count INTEGER NOT NULL DEFAULT 0")
+            db.execute("UPDATE positions SET tp_price = entry_price * ?, sl_price = entry_price * ?", (1 + TAKE_PROFIT, 1 + STOP_LOSS))
+            self.recount(db)
+        db.executescript(BOOK_SCHEMA)
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def recount(self, db):
+        db.execute("""
+            UPDATE account SET
+                cost_basis = (SELECT COALESCE(SUM(units * entry_price), 0) FROM positions),
+                open_count = (SELECT COUNT(*) FROM positions)
+            WHERE id = 1""")
+        db.execute("DELETE FROM exposure")
+        db.execute("""
+            INSERT INTO exposure (ticker, units, cost_basis, open_count)
+            SELECT ticker, SUM(units), SUM(units * entry_price), COUNT(*) FROM positions GROUP BY ticker""")
+
+    def connect(self):
+        return state_db(self.path)
+
+    def transaction(self):
+        return Transaction(self.connect())
+
+    # --- READS ---
+    def balance(self):
+        return self.connect().execute("SELECT balance FROM account WHERE id = 1").fetchone()[0]
+
+    def positions(self, ticker=None):
+        db = self.connect()
+        if ticker is None: rows = db.execute("SELECT * FROM positions ORDER BY id")
+        else: rows = db.execute("SELECT * FROM positions WHERE ticker = ? ORDER BY id", (ticker,))
+        return [dict(r) for r in rows]
+
+    def triggered(self, ticker, price):
+        """Positions of ticker whose take-profit or stop-loss price has been crossed (index range scans)."""
+        rows = self.connect().execute("""
+            SELECT * FROM positions WHERE ticker = ? AND tp_price <= ?
+            UNION
+            SELECT * FROM positions WHERE ticker = ? AND sl_price >= ?
+            ORDER BY id""", (ticker, price * (1 + TRIGGER_SLACK), ticker, price * (1 - TRIGGER_SLACK)))
+        return [dict(r) for r in rows]
+
+    def totals(self):
+        # Running aggregates kept on the account row -> O(1) regardless of book size
+        row = self.connect().execute(
+            "SELECT balance, cost_basis, open_count AS open_trades FROM account WHERE id = 1"
+        ).fetchone()
+        return dict(row)
+
+    def exposure(self):
+        rows = self.connect().execute("SELECT ticker, units, cost_basis FROM exposure WHERE open_count > 0")
+        return {r["ticker"]: {"units": r["units"], "cost_basis": r["cost_basis"]} for r in rows}
+
+    def history(self, ticker=None, since=None, limit=100):
+        query, args = "SELECT ticker, profit, exit_price, time, closed_at FROM history WHERE 1=1", []
+        if ticker is not None: query += " AND ticker = ?"; args.append(ticker)
+        if since is not None: query += " AND closed_at >= ?"; args.append(since)
+        query += " ORDER BY closed_at DESC, id DESC LIMIT ?"
+        args.append(limit)
+        return [dict(r) for r in self.connect().execute(query, args)]
+
+    # --- WRITES (O(1) rows touched per trade) ---
+    def open_position(self, ticker, price, size, key=None):
+        """Buys size worth of ticker. With a key, only the first call per key trades; later
+        calls (a recomputed signal) get that first outcome back without touching the book."""
+        units = size / price
+        with self.transaction() as db:
+            if key is not None:
+                decided = db.execute("SELECT opened FROM trade_keys WHERE key = ?", (key,)).fetchone()
+                if decided: return bool(decided["opened"])
+            debited = db.execute("""
+                UPDATE account SET balance = balance - ?, cost_basis = cost_basis + ?, open_count = open_count + 1
+                WHERE id = 1 AND balance >= ?""", (size, units * price, size)).rowcount
+            if key is not None:
+                now = time.time()
+                db.execute("INSERT INTO trade_keys (key, opened, decided_at) VALUES (?, ?, ?)", (key, int(bool(debited)), now))
+                db.execute("DELETE FROM trade_keys WHERE decided_at < ?", (now - TRADE_KEY_TTL,))
+            if not debited: return False
+            db.execute(
+                "INSERT INTO positions (ticker, entry_price, units, cost, timestamp, tp_price, sl_price) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (ticker, price, units, size, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), price * (1 + TAKE_PROFIT), price * (1 + STOP_LOSS))
+            )
+            db.execute("""
+                INSERT INTO exposure (ticker, units, cost_basis, open_count) VALUES (?, ?, ?, 1)
+                ON CONFLICT (ticker) DO UPDATE SET
+                    units = units + excluded.units, cost_basis = cost_basis + excluded.cost_basis, open_count = open_count + 1""",
+                (ticker, units, units * price))
+            return True
+
+    def close_positions(self, ticker, exit_price, position_ids):
+        """Sells the given positions at exit_price. Returns realized PnL."""
+        realized = 0
+        now = time.time()
+        with self.transaction() as db:
+            for pid in position_ids:
+                pos = db.execute("SELECT units, cost, entry_price FROM positions WHERE id = ?", (pid,)).fetchone()
+                if pos is None: continue # Already closed by a concurrent request
+                db.execute("DELETE FROM positions WHERE id = ?", (pid,))
+                revenue = pos["units"] * exit_price
+                profit = revenue - pos["cost"]
+                db.execute("""
+                    UPDATE account SET balance = balance + ?, cost_basis = cost_basis - ?, open_count = open_count - 1
+                    WHERE id = 1""", (revenue, pos["units"] * pos["entry_price"]))
+                # Last position out resets exactly to 0 instead of leaving float dust
+                db.execute("""
+                    UPDATE exposure SET
+                        units = CASE WHEN open_count = 1 THEN 0 ELSE units - ? END,
+                        cost_basis = CASE WHEN open_count = 1 THEN 0 ELSE cost_basis - ? END,
+                        open_count = open_count - 1
+                    WHERE ticker = ?""", (pos["units"], pos["units"] * pos["entry_price"], ticker))
+                db.execute(
+                    "INSERT INTO history (ticker, profit, exit_price, time, closed_at) VALUES (?, ?, ?, ?, ?)",
+                    (ticker, profit, exit_price, datetime.fromtimestamp(now).strftime("%H:%M"), now)
+                )
+                realized += profit
+        return realized
+
+    # --- MIGRATION ---
+    def migrate_json(self, json_path):
+        """Imports a legacy portfolio.json once, then renames it so it is never re-imported."""
+        if not os.path.exists(json_path): return False
+        try:
+            with open(json_path, 'r') as f: data = json.load(f)
+        except: return False
+
+        with self.transaction() as db:
+            if db.execute("SELECT COUNT(*) FROM positions").fetchone()[0] or db.execute("SELECT COUNT(*) FROM history").fetchone()[0]:
+                return False # Store already has trades; don't merge a stale file into it
+            db.execute("UPDATE account SET balance = ? WHERE id = 1", (data.get("balance", 10000.0),))
+            for pos in data.get("positions", []):
+                entry = pos["entry_price"]
+                db.execute(
+                    "INSERT INTO positions (ticker, entry_price, units, cost, timestamp, tp_price, sl_price) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (pos["ticker"], entry, pos["units"], pos["units"] * entry, pos.get("timestamp", ""), entry * (1 + TAKE_PROFIT), entry * (1 + STOP_LOSS))
+                )
+            mtime = os.path.getmtime(json_path)
+            for trade in data.get("history", []):
+                # Legacy rows only kept "%H:%M"; order is preserved through the row id
+                db.execute(
+                    "INSERT INTO history (ticker, profit, exit_price, time, closed_at) VALUES (?, ?, ?, ?, ?)",
+                    (trade["ticker"], trade["profit"], trade["exit_price"], trade.get("time", ""), mtime)
+                )
+            self.recount(db)
+        try: os.replace(json_path, json_path + ".migrated")
+        except FileNotFoundError: return False # Another worker imported the same (empty) file first
+        print(f"📦 Migrated {json_path} -> {self.path}")
+        return True
+
+class Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolled back on any exception."""
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        return False
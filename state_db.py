@@ -0,0 +1,22 @@
+import sqlite3
+import threading
+
+# --- STATE FILES (SQLite in WAL mode, shared by every uvicorn worker) ---
+# Every store opens its file through state_db(), so lock timeout and pragmas are the
+# same everywhere: WAL lets readers keep going while one writer commits.
+STATE_TIMEOUT = 10.0 # Seconds a writer waits for another worker's lock before raising
+
+local = threading.local()
+
+def state_db(path):
+    """This thread's connection to path (sqlite3 connections must not be shared across threads)."""
+    dbs = getattr(local, "dbs", None)
+    if dbs is None: dbs = local.dbs = {}
+    db = dbs.get(path)
+    if db is None:
+        db = sqlite3.connect(path, timeout=STATE_TIMEOUT, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        dbs[path] = db
+    return db
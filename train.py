@@ -4,6 +4,7 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, classification_report
 import joblib
 from model import DataProcessor
+from indicators import FEATURE_COLS
 
 def train():
     print("🚀 Starting Random Forest Training...")
@@ -31,8 +32,7 @@ def train():
     df.dropna(inplace=True)
 
     # 4. Prepare Features (X) and Target (y)
-    feature_cols = ['Log_Ret', 'Vol', 'RSI', 'Momentum']
-    X = df[feature_cols]
+    X = df[FEATURE_COLS]
     y = df['Target']
     
     # 5. Split Data (Train on Past, Test on Future)
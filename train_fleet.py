@@ -1,49 +1,148 @@
+import os
+import sys
+import time
+import argparse
+import fcntl
+import threading
+import subprocess
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score
 import joblib
 from model import DataProcessor
+from indicators import FEATURE_COLS
+from candle_store import CandleStore
+from forest import export_compact, compact_path
 
 # LIST OF ASSETS TO TRAIN
 ASSETS = ["BTC-USD", "ETH-USD", "SOL-USD", "DOGE-USD"]
+TRAIN_WINDOW = "59d" # Train on the same window Yahoo serves for 15m bars
+HORIZON = 4          # Target: Price UP in 1 hour (4 candles)
 
-def train_asset(ticker):
-    print(f"\n🚀 Training Agent for: {ticker}...")
-    
-    processor = DataProcessor()
-    # Fetch 59 days of history for THIS specific coin
-    df = processor.fetch_live_data(ticker=ticker, period="59d", interval="15m")
-    
-    if df is None or len(df) < 100:
-        print(f"❌ Not enough data for {ticker}")
-        return
-
+def build_dataset(processor, candles, window=TRAIN_WINDOW):
+    """Features + target for one ticker's raw candles (last `window` of history)."""
+    df = candles[candles.index >= candles.index[-1] - pd.Timedelta(window)].copy()
     df = processor.add_indicators(df)
-    
-    # Target: Price UP in 1 hour (4 candles)
-    df['Target_Price'] = df['Close'].shift(-4)
+    df['Target_Price'] = df['Close'].shift(-HORIZON)
     df['Target'] = (df['Target_Price'] > df['Close']).astype(int)
     df.dropna(inplace=True)
+    return df[FEATURE_COLS].to_numpy(), df['Target'].to_numpy()
+
+def save_model(model, filename):
+    # Write-then-rename: the server (or its model watcher) never loads a half-written pickle
+    tmp = f"{filename}.tmp"
+    joblib.dump(model, tmp)
+    os.replace(tmp, filename)
+
+def train_asset(ticker, X, y, n_jobs=1, compact=True):
+    print(f"\n🚀 Training Agent for: {ticker} ({len(X)} samples, {n_jobs} cores)...")
+    start = time.perf_counter()
 
-    feature_cols = ['Log_Ret', 'Vol', 'RSI', 'Momentum']
-    X = df[feature_cols]
-    y = df['Target']
-    
     # Train
     split = int(len(X) * 0.8)
-    model = RandomForestClassifier(n_estimators=100, min_samples_split=50, random_state=42)
-    model.fit(X.iloc[:split], y.iloc[:split])
-    
+    model = RandomForestClassifier(n_estimators=100, min_samples_split=50, random_state=42, n_jobs=n_jobs)
+    model.fit(X[:split], y[:split])
+
     # Evaluate
-    acc = accuracy_score(y.iloc[split:], model.predict(X.iloc[split:]))
+    acc = accuracy_score(y[split:], model.predict(X[split:]))
     print(f"🎯 {ticker} Accuracy: {acc:.4f}")
-    
+
     # SAVE with the Ticker Name
+    model.n_jobs = None # Serving predicts one row at a time; don't carry the training pool size
     filename = f"model_{ticker}.pkl"
-    joblib.dump(model, filename)
-    print(f"💾 Brain Saved: {filename}")
+    save_model(model, filename)
+    if compact: export_compact(model, compact_path(ticker))
+    print(f"💾 Brain Saved: {filename} ({time.perf_counter() - start:.1f}s)")
+    return ticker, acc, filename
+
+def plan_jobs(n_assets, n_jobs):
+    # Split the core budget: one process per asset, remaining cores go to each forest's trees
+    workers = max(1, min(n_assets, n_jobs))
+    return workers, max(1, n_jobs // workers)
+
+def train_fleet(tickers=ASSETS, n_jobs=None, offline=False, store=None, compact=True):
+    """Batched download -> cached candles -> shared feature pipeline -> parallel fits."""
+    store = store or CandleStore()
+    processor = DataProcessor()
+    candles = store.load_many(tickers) if offline else store.update(processor, tickers, period=TRAIN_WINDOW)
+
+    datasets = {}
+    for ticker in tickers:
+        df = candles.get(ticker)
+        X, y = build_dataset(processor, df) if df is not None else (None, None)
+        if X is None or len(X) < 100:
+            print(f"❌ Not enough data for {ticker}")
+            continue
+        datasets[ticker] = (X, y)
+    if not datasets: return []
+
+    workers, per_model = plan_jobs(len(datasets), n_jobs or os.cpu_count() or 1)
+    print(f"🧵 {len(datasets)} assets on {workers} processes x {per_model} cores")
+    if workers == 1:
+        return [train_asset(t, X, y, per_model, compact) for t, (X, y) in datasets.items()]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(train_asset, t, X, y, per_model, compact) for t, (X, y) in datasets.items()]
+        return [f.result() for f in futures]
+
+class RetrainScheduler:
+    """Retrains the fleet every `hours` in a separate, low-priority process.
+
+    Candles come from the on-disk store plus one delta download, so each run only
+    fetches what is new. Models are written atomically and picked up by the server's
+    model watcher (ModelFleet.watch) without a restart. With several uvicorn workers
+    only the one holding lock_path schedules; the others just watch for the new files.
+    """
+    def __init__(self, hours, n_jobs=1, nice=10, lock_path=None):
+        self.hours = hours
+        self.lock_path = lock_path
+        self.lock_file = None
+        self.n_jobs = n_jobs
+        self.nice = nice
+        self.thread = None
+        self.last_run = None
+        self.last_status = None
+
+    def run_once(self):
+        cmd = [sys.executable, os.path.abspath(__file__), "--jobs", str(self.n_jobs)]
+        # Separate process + lower priority: fitting never competes with request threads for the GIL
+        result = subprocess.run(cmd, preexec_fn=lambda: os.nice(self.nice), capture_output=True, text=True)
+        self.last_run, self.last_status = time.time(), result.returncode
+        print(f"🧠 Scheduled retrain finished (exit {result.returncode})")
+        return result.returncode
+
+    def acquire(self):
+        if self.lock_path is None: return True
+        self.lock_file = open(self.lock_path, "w")
+        try:
+            # Held until this process exits, so a dead scheduler's lock is released by the OS
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            self.lock_file.close()
+            self.lock_file = None
+            return False
+
+    def start(self):
+        if self.thread or self.hours <= 0 or not self.acquire(): return
+        def loop():
+            while True:
+                time.sleep(self.hours * 3600)
+                try: self.run_once()
+                except Exception as e: print(f"⚠️ Scheduled retrain failed: {e}")
+        self.thread = threading.Thread(target=loop, name="retrain-scheduler", daemon=True)
+        self.thread.start()
 
 if __name__ == "__main__":
-    for coin in ASSETS:
-        train_asset(coin)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Retrain every fleet model")
+    parser.add_argument("tickers", nargs="*", default=ASSETS)
+    parser.add_argument("--jobs", type=int, default=None, help="Total CPU cores to use (default: all)")
+    parser.add_argument("--offline", action="store_true", help="Train from cached candles only, no download")
+    parser.add_argument("--no-compact", action="store_true", help="Skip the flat-array export used for serving")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = train_fleet(args.tickers, n_jobs=args.jobs, offline=args.offline, compact=not args.no_compact)
+    print(f"\n✅ Fleet retrained: {len(results)}/{len(args.tickers)} assets in {time.perf_counter() - start:.1f}s")
+    sys.exit(0 if len(results) == len(args.tickers) else 1)